@@ -1,7 +1,12 @@
 # backend/binary_updater.py
 
 import os
-import requests
+import re
+import json
+import hashlib
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # The official GitHub API endpoint for the HB-Store releases
 GITHUB_API_URL = "https://api.github.com/repos/LightningMods/PS4-Store/releases"
@@ -15,68 +20,166 @@ ASSET_NAMES = [
     'store.prx.sig',
 ]
 
+# remote.md5 holds the MD5 of this asset; the download is rejected if they don't match
+MD5_CHECKED_ASSET = 'homebrew.elf'
+
 # The local directory where we will store these downloaded binaries
 BIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), 'bin'))
 
-def get_latest_release_assets() -> dict:
+# Release tag and GitHub ETag of the binaries currently in BIN_DIR
+STATE_PATH = os.path.join(BIN_DIR, 'release.json')
+
+# One update at a time: concurrent runs would share the .part temp files
+_update_lock = threading.Lock()
+
+def _new_session():
+    # requests is imported on first use, so the server can import this module (BIN_DIR) cheaply at startup
+    import requests
+    return requests.Session()
+
+# Used to create the HTTP session. Tests can swap this for a fake with the same .get() interface.
+session_factory = _new_session
+
+# Called with the list of updated file names after binaries were swapped in
+_update_listeners = []
+
+def add_update_listener(callback):
+    _update_listeners.append(callback)
+
+def _load_state() -> dict:
+    try:
+        with open(STATE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_state(state: dict):
+    tmp_path = STATE_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=4)
+    os.replace(tmp_path, STATE_PATH)
+
+def get_latest_release_assets(session=None, etag: str = None):
     """
-    Fetches the latest release from the GitHub API and returns a dictionary
-    of required asset names and their download URLs.
+    Fetches the latest release from the GitHub API. Sends If-None-Match when an
+    ETag is known. Returns (release dict or None if not modified, etag, asset urls).
+    Raises on network/API errors.
     """
+    session = session or session_factory()
     print("Checking GitHub for the latest HB-Store release...")
-    try:
-        response = requests.get(GITHUB_API_URL, timeout=15)
+    headers = {'Accept': 'application/vnd.github+json'}
+    if etag: headers['If-None-Match'] = etag
+    response = session.get(GITHUB_API_URL, headers=headers, timeout=15)
+    if response.status_code == 304:
+        print("GitHub reports no new release (304 Not Modified).")
+        return None, etag, {}
+    response.raise_for_status()
+    releases = response.json()
+
+    if not releases:
+        raise ValueError("No releases found on GitHub.")
+
+    latest_release = releases[0] # The first one is the latest
+    assets = latest_release.get("assets", [])
+
+    asset_urls = {
+        asset['name']: asset['browser_download_url']
+        for asset in assets if asset['name'] in ASSET_NAMES
+    }
+
+    print(f"Found latest release: {latest_release['tag_name']}")
+    return latest_release, response.headers.get('ETag'), asset_urls
+
+def _part_path(name: str) -> str:
+    return os.path.join(BIN_DIR, f".{name}.part")
+
+def _download_asset(session, name: str, url: str) -> tuple:
+    """Streams one asset into a temp file in BIN_DIR. Returns (temp path, md5 hex)."""
+    tmp_path = _part_path(name)
+    md5 = hashlib.md5()
+    print(f"Downloading {name}...")
+    with session.get(url, timeout=30, stream=True) as response:
         response.raise_for_status()
-        releases = response.json()
-        
-        if not releases:
-            raise ValueError("No releases found on GitHub.")
-            
-        latest_release = releases[0] # The first one is the latest
-        assets = latest_release.get("assets", [])
-        
-        asset_urls = {
-            asset['name']: asset['browser_download_url']
-            for asset in assets if asset['name'] in ASSET_NAMES
-        }
-        
-        print(f"Found latest release: {latest_release['tag_name']}")
-        return asset_urls
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                f.write(chunk); md5.update(chunk)
+    return tmp_path, md5.hexdigest()
 
-    except Exception as e:
-        print(f"Error fetching from GitHub API: {e}")
-        return {}
+def _all_assets_present(names) -> bool:
+    return all(os.path.exists(os.path.join(BIN_DIR, name)) for name in names)
 
-def update_binaries():
+def update_binaries(force: bool = False, session=None):
     """
     Downloads the required binaries from the latest GitHub release
     into the local '/backend/bin' directory.
+    Skipped when GitHub reports no change (ETag) or the release tag is the one we
+    already have. Assets are downloaded in parallel to temp files, checked against
+    remote.md5 and only then swapped in.
     """
-    asset_urls = get_latest_release_assets()
+    if not _update_lock.acquire(blocking=False):
+        return {"success": False, "updated": False, "message": "An HB-Store binary update is already running."}
+    try:
+        return _run_update(force, session)
+    finally:
+        _update_lock.release()
+
+def _run_update(force: bool, session):
+    os.makedirs(BIN_DIR, exist_ok=True)
+    session = session or session_factory()
+    state = _load_state()
+    have_files = _all_assets_present(state.get('assets', ASSET_NAMES))
+    try:
+        release, etag, asset_urls = get_latest_release_assets(session, None if force or not have_files else state.get('etag'))
+    except Exception as e:
+        print(f"Error fetching from GitHub API: {e}")
+        message = "Could not reach GitHub, keeping the existing binaries." if have_files else "Could not retrieve asset URLs from GitHub."
+        return {"success": have_files, "updated": False, "message": message}
+
+    if release is None:
+        return {"success": True, "updated": False, "message": f"HB-Store binaries are up to date ({state.get('tag', 'unknown')})."}
+    tag = release.get('tag_name')
+    if not force and have_files and tag and tag == state.get('tag'):
+        state['etag'] = etag; _save_state(state)
+        return {"success": True, "updated": False, "message": f"HB-Store binaries are up to date ({tag})."}
     if not asset_urls:
         print("Could not retrieve asset URLs. Aborting binary update.")
-        return {"success": False, "message": "Could not retrieve asset URLs from GitHub."}
+        return {"success": False, "updated": False, "message": "Could not retrieve asset URLs from GitHub."}
 
-    # Ensure the 'bin' directory exists
-    os.makedirs(BIN_DIR, exist_ok=True)
-    
     print("--- Starting HB-Store binary download ---")
+    downloads = {}
     try:
-        for name, url in asset_urls.items():
-            destination_path = os.path.join(BIN_DIR, name)
-            print(f"Downloading {name}...")
-            
-            # Download the file
-            download_response = requests.get(url, timeout=30)
-            download_response.raise_for_status()
-            
-            # Save the file
-            with open(destination_path, 'wb') as f:
-                f.write(download_response.content)
-            print(f" -> Saved to {destination_path}")
+        with ThreadPoolExecutor(max_workers=len(asset_urls)) as pool:
+            futures = {name: pool.submit(_download_asset, session, name, url) for name, url in asset_urls.items()}
+            for name, future in futures.items():
+                downloads[name] = future.result()
+
+        # Verify the main binary against the published checksum before touching anything
+        if 'remote.md5' in downloads and MD5_CHECKED_ASSET in downloads:
+            with open(downloads['remote.md5'][0], 'r', errors='ignore') as f:
+                match = re.search(r'[0-9a-fA-F]{32}', f.read())
+            if not match:
+                raise ValueError("remote.md5 does not contain an MD5 hash.")
+            if match.group(0).lower() != downloads[MD5_CHECKED_ASSET][1]:
+                raise ValueError(f"{MD5_CHECKED_ASSET} does not match remote.md5, download rejected.")
 
+        for name, (tmp_path, _) in downloads.items():
+            os.replace(tmp_path, os.path.join(BIN_DIR, name))
+            print(f" -> Saved to {os.path.join(BIN_DIR, name)}")
+        _save_state({'tag': tag, 'etag': etag, 'assets': sorted(asset_urls)})
+
+        for callback in _update_listeners:
+            callback(sorted(asset_urls))
         print("--- HB-Store binary update complete! ---")
-        return {"success": True, "message": "HB-Store binaries updated successfully!"}
+        return {"success": True, "updated": True, "message": f"HB-Store binaries updated successfully to {tag}!"}
     except Exception as e:
         print(f"An error occurred during download: {e}")
-        return {"success": False, "message": f"An error occurred: {e}"}
\ No newline at end of file
+        return {"success": False, "updated": False, "message": f"An error occurred: {e}"}
+    finally:
+        for name in asset_urls:
+            if os.path.exists(_part_path(name)): os.remove(_part_path(name))
+
+async def update_binaries_in_background(force: bool = False):
+    """Runs update_binaries in a worker thread so startup and requests are never blocked."""
+    result = await asyncio.to_thread(update_binaries, force)
+    print(f"[*] Binary update: {result['message']}")
+    return result
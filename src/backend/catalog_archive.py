@@ -0,0 +1,174 @@
+# backend/catalog_archive.py
+#
+# Export/import of the whole catalog for bootstrapping another CDN node from the
+# same (mirrored) share without re-parsing and re-scraping every PKG. An archive is
+# one SQLite file holding:
+#
+#   packages  - the full catalog index rows: parsed SFO metadata, scraped store data
+#               and the (path, size, mtime) fingerprint of each file
+#   icons     - the icon PNGs referenced by the packages
+#   titles    - the local title database (see title_db.py)
+#
+# On import every package is checked against the local disk; only entries whose
+# file exists with the same size and mtime are added to the index, so the next
+# scan reuses them and only parses what differs. Paths can be remapped when the
+# share is mounted elsewhere on the new node.
+#
+# From the 'src' folder:
+#   python -m backend.catalog_archive export catalog-archive.db
+#   python -m backend.catalog_archive import catalog-archive.db --map /mnt/nas=/srv/nas
+
+import os
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from . import catalog_index, pkg_manager, title_db
+
+ARCHIVE_FORMAT = "ps4cdn-catalog"
+ARCHIVE_VERSION = 1
+
+# Files are stat'ed in parallel on import; network shares answer much faster this way
+VERIFY_CONCURRENCY = 16
+
+ICON_URL_PREFIX = "/static/icons/"
+
+def _icon_name(metadata: dict) -> Optional[str]:
+    icon_url = metadata.get('icon_url') or ''
+    if not icon_url.startswith(ICON_URL_PREFIX): return None
+    name = os.path.basename(icon_url[len(ICON_URL_PREFIX):])
+    return name or None
+
+def export_archive(archive_path: str, icon_cache_dir: str = None) -> dict:
+    """Writes the catalog index, icons and title database to a new archive file. Returns counts."""
+    icon_cache_dir = icon_cache_dir or pkg_manager.get_icon_cache_dir()
+    tmp_path = f"{archive_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path): os.remove(tmp_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        con.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        con.execute("CREATE TABLE packages (file_path TEXT PRIMARY KEY, library_root TEXT, file_size INTEGER, file_mtime INTEGER, metadata BLOB NOT NULL)")
+        con.execute("CREATE TABLE icons (name TEXT PRIMARY KEY, data BLOB NOT NULL)")
+        con.execute(f"CREATE TABLE titles ({', '.join(('title_id', 'content_id', 'locale') + title_db.FIELDS + ('source',))})")
+
+        rows = catalog_index.iter_rows()
+        # Metadata JSON compresses very well (repeated keys, localized titles)
+        con.executemany("INSERT INTO packages VALUES (?, ?, ?, ?, ?)", (
+            (path, root, size, mtime, zlib.compress(metadata.encode('utf-8'), 6)) for path, root, size, mtime, metadata in rows
+        ))
+        icon_count = 0
+        for name in sorted({_icon_name(json.loads(row[4])) for row in rows} - {None}):
+            try:
+                with open(os.path.join(icon_cache_dir, name), 'rb') as f:
+                    con.execute("INSERT INTO icons VALUES (?, ?)", (name, f.read()))
+                icon_count += 1
+            except OSError:
+                pass
+        titles = title_db.export_rows()
+        con.executemany(f"INSERT INTO titles VALUES ({', '.join('?' * (len(title_db.FIELDS) + 4))})", titles)
+        con.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ("format", ARCHIVE_FORMAT), ("version", str(ARCHIVE_VERSION)), ("created", str(int(time.time()))),
+        ])
+        con.commit()
+    finally:
+        con.close()
+    os.replace(tmp_path, archive_path)
+    stats = {"packages": len(rows), "icons": icon_count, "titles": len(titles), "size": os.path.getsize(archive_path)}
+    print(f"[*] Exported catalog archive {os.path.basename(archive_path)}: {stats}")
+    return stats
+
+def _remap(path: str, path_map: Dict[str, str]) -> str:
+    """Applies the longest matching 'old prefix -> new prefix' mapping."""
+    for old in sorted(path_map, key=len, reverse=True):
+        if path == old or path.startswith(old.rstrip('/\\') + '/') or path.startswith(old.rstrip('/\\') + '\\'):
+            return os.path.normpath(path_map[old] + path[len(old):])
+    return path
+
+def _matches_disk(path: str, size: int, mtime_ns: int) -> bool:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return st.st_size == size and st.st_mtime_ns == mtime_ns
+
+def import_archive(archive_path: str, path_map: Dict[str, str] = None, icon_cache_dir: str = None) -> dict:
+    """
+    Adds the archive's packages that match the local disk (path, size, mtime) to the
+    catalog index, and restores their icons and the title database. Returns counts.
+    """
+    path_map = path_map or {}
+    icon_cache_dir = icon_cache_dir or pkg_manager.get_icon_cache_dir()
+    con = sqlite3.connect(f"file:{archive_path}?mode=ro", uri=True)
+    try:
+        try:
+            meta = dict(con.execute("SELECT key, value FROM meta").fetchall())
+        except sqlite3.DatabaseError:
+            raise ValueError("Not a catalog archive.")
+        if meta.get("format") != ARCHIVE_FORMAT:
+            raise ValueError("Not a catalog archive.")
+        if int(meta.get("version") or 0) > ARCHIVE_VERSION:
+            raise ValueError(f"Catalog archive version {meta.get('version')} is newer than this server supports.")
+        rows = [
+            (_remap(path, path_map), _remap(root, path_map) if root else root, size, mtime, blob)
+            for path, root, size, mtime, blob in con.execute("SELECT file_path, library_root, file_size, file_mtime, metadata FROM packages")
+        ]
+        with ThreadPoolExecutor(max_workers=VERIFY_CONCURRENCY) as pool:
+            verified = list(pool.map(lambda row: _matches_disk(row[0], row[2], row[3]), rows))
+
+        packages, roots = [], set()
+        for (path, root, size, mtime, blob), ok in zip(rows, verified):
+            if not ok: continue
+            metadata = json.loads(zlib.decompress(blob))
+            metadata['file_path'] = path; metadata['library_root'] = root
+            packages.append(metadata); roots.add(root)
+        catalog_index.save_packages(packages)
+
+        icon_names = {_icon_name(pkg) for pkg in packages} - {None}
+        os.makedirs(icon_cache_dir, exist_ok=True)
+        icon_count = 0
+        for name, data in con.execute("SELECT name, data FROM icons"):
+            icon_path = os.path.join(icon_cache_dir, os.path.basename(name))
+            if name not in icon_names or os.path.exists(icon_path): continue
+            with open(icon_path, 'wb') as f: f.write(data)
+            icon_count += 1
+        new_titles = title_db.import_rows(con.execute("SELECT * FROM titles"))
+    finally:
+        con.close()
+    stats = {
+        "packages": len(rows), "imported": len(packages), "skipped": len(rows) - len(packages),
+        "icons": icon_count, "titles": new_titles, "library_roots": sorted(root for root in roots if root),
+    }
+    print(f"[*] Imported catalog archive {os.path.basename(archive_path)}: {stats['imported']} of {stats['packages']} packages match the local disk, {stats['icons']} icons, {stats['titles']} new titles.")
+    return stats
+
+def parse_path_map(entries: Iterable[str]) -> Dict[str, str]:
+    """['/mnt/nas=/srv/nas', ...] -> {'/mnt/nas': '/srv/nas'}"""
+    path_map = {}
+    for entry in entries:
+        entry = entry.strip()
+        if not entry: continue
+        if '=' not in entry: raise ValueError(f"Invalid path mapping '{entry}', expected OLD=NEW.")
+        old, new = entry.split('=', 1)
+        path_map[old.strip()] = new.strip()
+    return path_map
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Export/import the catalog to bootstrap another CDN node")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="Write the catalog, icons and title database to an archive")
+    export_parser.add_argument("path")
+    import_parser = commands.add_parser("import", help="Import an archive, keeping only packages that match the local disk")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--map", action="append", default=[], metavar="OLD=NEW", help="Rewrite path prefixes, e.g. /mnt/nas=/srv/nas (repeatable)")
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        stats = export_archive(args.path)
+    else:
+        stats = import_archive(args.path, parse_path_map(args.map))
+    print(json.dumps(stats, indent=4))
+
+if __name__ == "__main__":
+    main()
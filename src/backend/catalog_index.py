@@ -0,0 +1,120 @@
+# backend/catalog_index.py
+#
+# On-disk index of everything we know about each PKG file (all SFO keys, scraped
+# store data, file fingerprint). The in-memory package records only keep the hot
+# fields; descriptions and rarely used SFO values are read from here on demand.
+
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List
+
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'catalog.db')
+# Holds the version of the last published catalog; other worker processes poll it
+VERSION_PATH = CATALOG_PATH + '.version'
+
+_conn = None
+_lock = threading.Lock()
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(CATALOG_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS packages (
+                file_path TEXT PRIMARY KEY,
+                library_root TEXT,
+                file_size INTEGER,
+                file_mtime INTEGER,
+                metadata TEXT NOT NULL
+            )""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS packages_root ON packages (library_root)")
+        # The merged, post-processed package list as published in store.db (position = pid - 1)
+        _conn.execute("CREATE TABLE IF NOT EXISTS published (position INTEGER PRIMARY KEY, record TEXT NOT NULL)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        _conn.commit()
+    return _conn
+
+def save_packages(packages: Iterable[dict]):
+    """Inserts or replaces the full metadata of the given packages."""
+    rows = [
+        (pkg['file_path'], pkg.get('library_root'), pkg.get('file_size'), pkg.get('file_mtime'), json.dumps(pkg))
+        for pkg in packages
+    ]
+    if not rows: return
+    with _lock:
+        conn = _get_conn()
+        conn.executemany("INSERT OR REPLACE INTO packages VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+def prune_root(library_root: str, keep_paths: Iterable[str]):
+    """Removes index entries of files that are no longer present in a library root."""
+    keep = set(keep_paths)
+    with _lock:
+        conn = _get_conn()
+        stale = [(path,) for (path,) in conn.execute("SELECT file_path FROM packages WHERE library_root = ?", (library_root,)) if path not in keep]
+        if stale:
+            conn.executemany("DELETE FROM packages WHERE file_path = ?", stale)
+            conn.commit()
+
+def load_metadata(file_path: str) -> dict:
+    """Returns the full stored metadata of one package, or {} if it is not indexed."""
+    with _lock:
+        row = _get_conn().execute("SELECT metadata FROM packages WHERE file_path = ?", (file_path,)).fetchone()
+    return json.loads(row[0]) if row else {}
+
+def load_many(file_paths: Iterable[str], keys: Iterable[str]) -> Dict[str, dict]:
+    """Reads a few (scalar) metadata keys of many packages at once, keyed by file path. Missing keys are left out."""
+    keys = tuple(keys)
+    if not keys: return {}
+    columns = ", ".join("json_extract(metadata, ?)" for _ in keys)
+    # Only the wanted rows and fields are read; the metadata JSON is not decoded in Python
+    params = [f'$."{key}"' for key in keys] + [json.dumps(list(file_paths))]
+    with _lock:
+        rows = _get_conn().execute(f"SELECT file_path, {columns} FROM packages WHERE file_path IN (SELECT value FROM json_each(?))", params).fetchall()
+    return {row[0]: {key: value for key, value in zip(keys, row[1:]) if value is not None} for row in rows}
+
+def load_root(library_root: str) -> List[dict]:
+    """Returns the full metadata of every indexed package in a library root."""
+    with _lock:
+        rows = _get_conn().execute("SELECT metadata FROM packages WHERE library_root = ? ORDER BY rowid", (library_root,)).fetchall()
+    return [json.loads(metadata) for (metadata,) in rows]
+
+def iter_rows() -> List[tuple]:
+    """All index rows as stored: (file_path, library_root, file_size, file_mtime, metadata JSON)."""
+    with _lock:
+        return _get_conn().execute("SELECT file_path, library_root, file_size, file_mtime, metadata FROM packages ORDER BY rowid").fetchall()
+
+# --- Published catalog, shared between worker processes ---
+def read_version() -> int:
+    try:
+        with open(VERSION_PATH, 'r') as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def save_published(records: Iterable[dict], base_uri: str) -> int:
+    """Stores the published package list and bumps the catalog version. Returns the new version."""
+    rows = [(position, json.dumps(record)) for position, record in enumerate(records)]
+    version = read_version() + 1
+    with _lock:
+        conn = _get_conn()
+        with conn:
+            conn.execute("DELETE FROM published")
+            conn.executemany("INSERT INTO published VALUES (?, ?)", rows)
+            conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [("base_uri", base_uri), ("version", str(version))])
+    tmp_path = f"{VERSION_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(str(version))
+    os.replace(tmp_path, VERSION_PATH)
+    return version
+
+def load_published():
+    """Returns (records, version, base_uri) of the last published catalog."""
+    with _lock:
+        conn = _get_conn()
+        rows = conn.execute("SELECT record FROM published ORDER BY position").fetchall()
+        meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+    return [json.loads(record) for (record,) in rows], int(meta.get("version") or 0), meta.get("base_uri")
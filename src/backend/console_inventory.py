@@ -0,0 +1,133 @@
+# backend/console_inventory.py
+#
+# Background discovery and health polling of consoles. Consoles running an FTP
+# server on the configured port are found with a bounded, concurrent TCP probe
+# across a subnet; known consoles are re-checked on a schedule. Hits on /store.db
+# and /api.php are recorded too, so we know which consoles actually use the store.
+#
+# Everything else (provisioning, the web UI) reads the cached inventory instead of
+# waiting for FTP connection timeouts.
+
+import time
+import asyncio
+from typing import Callable, List, Optional
+
+# Defaults, overridable in config.json
+HEALTH_INTERVAL = 60        # Seconds between reachability checks of known consoles
+DISCOVERY_INTERVAL = 600    # Seconds between subnet discoveries (if "discovery_subnet" is set)
+PROBE_TIMEOUT = 1.0
+PROBE_CONCURRENCY = 64
+
+# ip -> console dict
+_consoles = {}
+
+def _entry(ip: str) -> dict:
+    if ip not in _consoles:
+        _consoles[ip] = {
+            "ip": ip, "ftp_port": None, "reachable": None, "latency_ms": None, "banner": None,
+            "last_checked": None, "last_seen": None, "last_store_fetch": None,
+            "last_hash_check": None, "store_fetches": 0,
+        }
+    return _consoles[ip]
+
+async def probe(host: str, port: int, timeout: float = PROBE_TIMEOUT) -> dict:
+    """Opens a TCP connection to the console's FTP port and reads the greeting."""
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return {"ip": host, "reachable": False}
+    latency_ms = round((time.perf_counter() - started) * 1000, 1)
+    banner = None
+    try:
+        line = await asyncio.wait_for(reader.readline(), timeout)
+        banner = line.decode('utf-8', 'ignore').strip() or None
+    except (OSError, asyncio.TimeoutError):
+        pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    # Something listens there; only count it as an FTP server if it greets like one
+    return {"ip": host, "reachable": banner is None or banner.startswith("220"), "latency_ms": latency_ms, "banner": banner}
+
+def _record_probe(result: dict, port: int):
+    entry = _entry(result["ip"])
+    now = time.time()
+    entry["last_checked"] = now; entry["ftp_port"] = port
+    entry["reachable"] = result["reachable"]
+    if result["reachable"]:
+        entry["last_seen"] = now; entry["latency_ms"] = result.get("latency_ms"); entry["banner"] = result.get("banner")
+    else:
+        entry["latency_ms"] = None
+
+async def _probe_all(hosts: List[str], port: int, timeout: float, concurrency: int, record_unreachable: bool):
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    async def _one(host):
+        async with semaphore:
+            result = await probe(host, port, timeout)
+        if result["reachable"] or record_unreachable: _record_probe(result, port)
+        return result
+    return await asyncio.gather(*(_one(host) for host in hosts))
+
+async def discover(targets: List[str], port: int, timeout: float = PROBE_TIMEOUT, concurrency: int = PROBE_CONCURRENCY) -> List[dict]:
+    """Probes every host in the targets (IPs or subnets); consoles that answer are added to the inventory."""
+    from . import ps4_ftp_client # Imported on first use, keeps ftplib out of startup
+    hosts = ps4_ftp_client.expand_targets(targets)
+    print(f"--- Discovering consoles on {len(hosts)} host(s), FTP port {port} ---")
+    # Hosts we already know are updated either way; unknown hosts only if they answer
+    results = await _probe_all(hosts, port, timeout, concurrency, record_unreachable=False)
+    for result in results:
+        if not result["reachable"] and result["ip"] in _consoles: _record_probe(result, port)
+    found = [result for result in results if result["reachable"]]
+    print(f"--- Discovery complete. {len(found)} console(s) found. ---")
+    return found
+
+async def check_known(port: int, timeout: float = PROBE_TIMEOUT, concurrency: int = PROBE_CONCURRENCY):
+    """Re-checks the reachability and latency of every console in the inventory."""
+    if _consoles:
+        await _probe_all(list(_consoles), port, timeout, concurrency, record_unreachable=True)
+
+def record_fetch(ip: Optional[str], kind: str, when: float = None):
+    """Called from the /store.db and /api.php endpoints (when: time of a fetch another worker served)."""
+    if not ip: return
+    entry = _entry(ip)
+    now = when or time.time()
+    entry["last_seen"] = max(entry["last_seen"] or 0, now)
+    if kind == "store.db":
+        entry["last_store_fetch"] = max(entry["last_store_fetch"] or 0, now); entry["store_fetches"] += 1
+    else:
+        entry["last_hash_check"] = max(entry["last_hash_check"] or 0, now)
+
+def is_reachable(ip: str, max_age: float = None) -> Optional[bool]:
+    """Cached reachability of a console, or None if unknown (or older than max_age seconds)."""
+    entry = _consoles.get(ip)
+    if not entry or entry["last_checked"] is None: return None
+    if max_age is not None and time.time() - entry["last_checked"] > max_age: return None
+    return entry["reachable"]
+
+def get_inventory() -> List[dict]:
+    return sorted((dict(entry) for entry in _consoles.values()), key=lambda entry: tuple(int(p) if p.isdigit() else 0 for p in entry["ip"].split('.')))
+
+async def run_service(get_config: Callable[[], dict]):
+    """Background loop: periodic subnet discovery and health checks of known consoles."""
+    loop = asyncio.get_running_loop()
+    last_discovery = None
+    while True:
+        config = get_config()
+        port = int(config.get("ps4_port") or 2121)
+        try:
+            if config.get("ps4_ip"): _entry(config["ps4_ip"])
+            subnet = config.get("discovery_subnet")
+            discovery_interval = int(config.get("discovery_interval") or DISCOVERY_INTERVAL)
+            if subnet and (last_discovery is None or loop.time() - last_discovery >= discovery_interval):
+                last_discovery = loop.time()
+                await discover([subnet], port)
+            await check_known(port)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Console health check failed: {e}")
+        await asyncio.sleep(int(config.get("health_interval") or HEALTH_INTERVAL))
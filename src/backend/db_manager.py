@@ -6,21 +6,26 @@ import shutil
 DB_TEMPLATE = os.path.join(os.path.dirname(__file__), 'store.clean.db')
 DB_PATH = os.path.join(os.path.dirname(__file__), 'store.db')
 
-def create_db_from_packages(packages: list):
+def create_db_from_packages(packages, db_path: str = DB_PATH):
     """
     Creates a new store.db by copying a template and inserting package data.
+    packages can be any iterable of store items, e.g. a generator, so the
+    full list of items never has to be held in memory.
+    The DB is built next to db_path and swapped in when complete, so consoles
+    downloading the old file are never served a half-written one.
     """
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
     # 1. Renew the DB by copying the clean template
     try:
-        shutil.copyfile(DB_TEMPLATE, DB_PATH)
-        print("Renewed store.db from template.")
+        shutil.copyfile(DB_TEMPLATE, tmp_path)
+        print(f"Renewed {os.path.basename(db_path)} from template.")
     except Exception as e:
         print(f"ERROR renewing database: {e}")
         return False
 
     # 2. Connect to the new DB and insert all items
     try:
-        con = sqlite3.connect(DB_PATH)
+        con = sqlite3.connect(tmp_path)
         cur = con.cursor()
 
         # The INSERT statement must match the table structure exactly
@@ -32,19 +37,20 @@ def create_db_from_packages(packages: list):
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """
         
-        # Create a list of tuples for executemany
-        data_to_insert = []
-        for item in packages:
-            data_to_insert.append(tuple(item.get(key) for key in [
-                "pid", "id", "name", "desc", "image", "package", "version", "picpath",
-                "desc_1", "desc_2", "ReviewStars", "Size", "Author", "apptype",
-                "pv", "main_icon_path", "main_menu_pic", "releaseddate"
-            ]))
+        # Stream tuples into executemany instead of building a list first
+        keys = [
+            "pid", "id", "name", "desc", "image", "package", "version", "picpath",
+            "desc_1", "desc_2", "ReviewStars", "Size", "Author", "apptype",
+            "pv", "main_icon_path", "main_menu_pic", "releaseddate"
+        ]
+        data_to_insert = (tuple(item.get(key) for key in keys) for item in packages)
         
         cur.executemany(sql, data_to_insert)
+        inserted = cur.rowcount
         con.commit()
         con.close()
-        print(f"Successfully inserted {len(packages)} items into store.db.")
+        os.replace(tmp_path, db_path)
+        print(f"Successfully inserted {inserted} items into {os.path.basename(db_path)}.")
         return True
     except Exception as e:
         print(f"ERROR inserting items into database: {e}")
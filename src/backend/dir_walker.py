@@ -0,0 +1,159 @@
+# backend/dir_walker.py
+#
+# Incremental directory walker built on os.scandir. On SMB/NFS shares every stat is a
+# network round trip, so we:
+#   - reuse the stat results that come with each DirEntry instead of stat-ing again,
+#   - remember the mtime of every directory (persisted between runs) and skip listing
+#     directories whose mtime did not change,
+#   - keep a shared stat cache that the download path uses for Content-Length/validators.
+#
+# Note: a directory's mtime only changes when entries are added, removed or renamed.
+# A PKG that is overwritten in place is picked up when get_stat() re-stats it for a
+# download, or by the next full walk (at least every FULL_WALK_SECONDS per root).
+
+import os
+import json
+import time
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+
+WALK_CACHE_PATH = 'walk_cache.json'
+
+# How long a cached stat result is trusted by get_stat() before the file is stat-ed again.
+STAT_TTL_SECONDS = 300
+
+# Incremental walks of a root turn into a full walk this often, to find PKGs overwritten in place
+FULL_WALK_SECONDS = 3600
+
+class WalkResult(NamedTuple):
+    files: List[Tuple[str, int, int]]  # (path, size, mtime_ns) of every .pkg file
+    changed: bool                      # Anything added/removed/modified since the last walk
+    dirs_listed: int
+    dirs_skipped: int
+
+# dir path -> [mtime_ns, [subdir names], {pkg name: [size, mtime_ns]}]
+_dir_cache = {}
+# file path -> (size, mtime_ns, checked_at)
+_stat_cache = {}
+# root path -> set of pkg paths found by the last walk (used to prune the caches)
+_root_files = {}
+# root path -> monotonic time of the last full walk (or of the first walk in this process)
+_last_full = {}
+_lock = threading.Lock()
+_loaded = False
+
+def _load_cache():
+    global _loaded
+    with _lock:
+        if _loaded: return
+        _loaded = True
+        if not os.path.exists(WALK_CACHE_PATH): return
+        try:
+            with open(WALK_CACHE_PATH, 'r') as f:
+                _dir_cache.update(json.load(f))
+            print(f"[*] Loaded directory cache with {len(_dir_cache)} entries from {WALK_CACHE_PATH}.")
+        except (OSError, ValueError) as e:
+            print(f"[!] Ignoring unreadable {WALK_CACHE_PATH}: {e}")
+
+def _save_cache():
+    with _lock:
+        snapshot = dict(_dir_cache)
+    tmp_path = WALK_CACHE_PATH + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, WALK_CACHE_PATH)
+    except OSError as e:
+        print(f"[!] Could not save {WALK_CACHE_PATH}: {e}")
+
+def _list_dir(path: str):
+    """Lists one directory, taking file sizes/mtimes from the DirEntry stat results."""
+    subdirs, files = [], {}
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.name.lower().endswith('.pkg') and entry.is_file():
+                    st = entry.stat()
+                    files[entry.name] = [st.st_size, st.st_mtime_ns]
+            except OSError:
+                continue
+    return sorted(subdirs), files
+
+def walk(base_path: str, full: bool = False) -> WalkResult:
+    """
+    Walks base_path and returns all .pkg files with their size and mtime.
+    Unless full is set, directories whose mtime is unchanged since the previous
+    walk are not listed again; their cached entries are used instead.
+    """
+    _load_cache()
+    base_path = os.path.abspath(base_path)
+    found, changed, listed, skipped = [], False, 0, 0
+    now = time.monotonic()
+    if now - _last_full.setdefault(base_path, now) >= FULL_WALK_SECONDS: full = True
+    if full: _last_full[base_path] = now
+    stack = [base_path]
+    while stack:
+        current = stack.pop()
+        try:
+            dir_mtime = os.stat(current).st_mtime_ns
+        except OSError:
+            changed = True; continue
+        cached = _dir_cache.get(current)
+        listed_now = full or not cached or cached[0] != dir_mtime
+        if not listed_now:
+            subdirs, files = cached[1], cached[2]; skipped += 1
+        else:
+            try:
+                subdirs, files = _list_dir(current)
+            except OSError as e:
+                print(f"[!] Could not list '{current}': {e}"); changed = True; continue
+            listed += 1
+            if not cached or cached[1] != subdirs or cached[2] != files: changed = True
+            with _lock:
+                _dir_cache[current] = [dir_mtime, subdirs, files]
+        for name in sorted(files):
+            path = os.path.join(current, name); size, mtime_ns = files[name]
+            if listed_now:
+                _stat_cache[path] = (size, mtime_ns, now)
+            else:
+                # Not listed, so the cached values may be old: keep the stat cache's own (newer) result
+                stat = _stat_cache.get(path)
+                if stat is None:
+                    _stat_cache[path] = (size, mtime_ns, now - STAT_TTL_SECONDS) # Already expired, the next get_stat() checks it
+                elif (stat[0], stat[1]) != (size, mtime_ns):
+                    size, mtime_ns = stat[0], stat[1]; changed = True
+                    with _lock:
+                        files[name] = [size, mtime_ns]
+            found.append((path, size, mtime_ns))
+        stack.extend(os.path.join(current, name) for name in reversed(subdirs))
+
+    paths = {path for path, _, _ in found}
+    with _lock:
+        for stale in _root_files.get(base_path, set()) - paths:
+            _stat_cache.pop(stale, None); changed = True
+        _root_files[base_path] = paths
+    if changed: _save_cache()
+    print(f"[*] Walked '{base_path}': {len(found)} packages, {listed} directories listed, {skipped} unchanged directories skipped.")
+    return WalkResult(files=found, changed=changed, dirs_listed=listed, dirs_skipped=skipped)
+
+def get_stat(path: str) -> Optional[Tuple[int, int]]:
+    """
+    Returns (size, mtime_ns) for a file, served from the walker's stat cache when
+    the entry is younger than STAT_TTL_SECONDS. Returns None if the file is missing.
+    """
+    cached = _stat_cache.get(path)
+    now = time.monotonic()
+    if cached and now - cached[2] < STAT_TTL_SECONDS:
+        return cached[0], cached[1]
+    try:
+        st = os.stat(path)
+    except OSError:
+        _stat_cache.pop(path, None); return None
+    _stat_cache[path] = (st.st_size, st.st_mtime_ns, now)
+    return st.st_size, st.st_mtime_ns
+
+def forget(path: str):
+    """Drops a file from the stat cache, e.g. after a failed read."""
+    _stat_cache.pop(path, None)
@@ -0,0 +1,169 @@
+# backend/download_sessions.py
+#
+# Registry of PKG downloads: which console is pulling which package, how fast and
+# how far along it is. A console installs a package with one or more (Range)
+# requests; requests from the same client for the same package are grouped into one
+# session while they keep coming within SESSION_IDLE_SECONDS of each other.
+#
+# The streaming loop only calls Transfer.sent() per chunk, which adds a few integers.
+# Progress is the share of the file covered by the ranges actually sent, so resumed
+# and parallel range requests count once. Sessions that went idle are moved to a
+# bounded history for throughput analysis.
+#
+# Served by GET /api/downloads and as a server-sent event feed, /api/downloads/events.
+# With several workers, each one shares its snapshot() and get_downloads() merges them.
+
+import os
+import time
+import itertools
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# A session without requests for this long is finished and moves to the history
+SESSION_IDLE_SECONDS = 30
+HISTORY_SIZE = 200
+# Requested ranges kept per session (the most recent ones)
+MAX_RANGES = 32
+# The current rate is re-measured at most this often
+RATE_WINDOW_SECONDS = 1.0
+
+_ids = itertools.count(1)
+_sessions: Dict[Tuple[str, str], "Session"] = {}
+history = deque(maxlen=HISTORY_SIZE)
+# Bumped on every start/finish, lets the event feed skip unchanged snapshots
+version = 0
+
+def _merge(intervals: List[list]) -> List[list]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]: merged[-1][1] = max(merged[-1][1], end)
+        else: merged.append([start, end])
+    return merged
+
+class Session:
+    __slots__ = ('id', 'client', 'pkg_index', 'title', 'content_id', 'filename', 'file_size', 'started', 'last_activity',
+                 'bytes_sent', 'rate', 'requests', 'active_requests', 'ranges', 'covered', 'outcome', 'status', 'ended',
+                 '_rate_at', '_rate_bytes')
+
+    def __init__(self, client: str, pkg: dict, pkg_index: int, filename: str, file_size: int):
+        self.id = next(_ids)
+        self.client, self.pkg_index, self.filename, self.file_size = client, pkg_index, filename, file_size
+        self.title, self.content_id = pkg.get('TITLE'), pkg.get('CONTENT_ID')
+        self.started = self.last_activity = time.time()
+        self.bytes_sent, self.rate, self.requests, self.active_requests = 0, 0.0, 0, 0
+        self.ranges = deque(maxlen=MAX_RANGES) # Requested (start, end), inclusive
+        self.covered = [] # Sent [start, end) intervals of finished requests, merged
+        self.outcome, self.status, self.ended = None, "active", None
+        self._rate_at, self._rate_bytes = time.monotonic(), 0
+
+    def _sent(self, n: int):
+        self.bytes_sent += n
+        now = time.monotonic()
+        elapsed = now - self._rate_at
+        if elapsed >= RATE_WINDOW_SECONDS:
+            current = (self.bytes_sent - self._rate_bytes) / elapsed
+            self.rate = current if not self.rate else 0.5 * self.rate + 0.5 * current
+            self._rate_at, self._rate_bytes = now, self.bytes_sent
+            self.last_activity = time.time()
+
+    def covered_bytes(self, open_intervals: List[list] = ()) -> int:
+        return sum(end - start for start, end in _merge(self.covered + list(open_intervals)))
+
+    def to_dict(self, open_intervals: List[list] = ()) -> dict:
+        covered = self.covered_bytes(open_intervals)
+        duration = (self.ended or time.time()) - self.started
+        return {
+            "id": self.id, "worker": os.getpid(), "client": self.client, "pkg_index": self.pkg_index, "title": self.title,
+            "content_id": self.content_id, "filename": self.filename, "file_size": self.file_size,
+            "bytes_sent": self.bytes_sent, "covered_bytes": covered,
+            "progress": round(min(covered / self.file_size, 1.0), 4) if self.file_size else None,
+            "rate_bps": round(self.rate) if self.active_requests else 0,
+            "avg_rate_bps": round(self.bytes_sent / duration) if duration > 0 else None,
+            "started": self.started, "last_activity": self.last_activity, "duration": round(duration, 1),
+            "requests": self.requests, "active_requests": self.active_requests,
+            "ranges": [f"{start}-{end}" for start, end in self.ranges], "status": self.status,
+        }
+
+class Transfer:
+    """One request of a session; the streaming loop reports sent bytes through it."""
+    __slots__ = ('session', 'start', 'pos')
+
+    def __init__(self, session: Session, start: int):
+        self.session, self.start, self.pos = session, start, start
+
+    def sent(self, n: int):
+        self.pos += n
+        self.session._sent(n)
+
+    def finish(self, outcome: str = "done"):
+        """outcome: 'done', 'cancelled' or 'failed'."""
+        global version
+        session = self.session
+        session.active_requests -= 1
+        if self.pos > self.start: session.covered = _merge(session.covered + [[self.start, self.pos]])
+        session.outcome = outcome; session.last_activity = time.time()
+        if not session.active_requests: session.rate = 0.0
+        _open.discard(self)
+        version += 1
+
+# Requests still streaming, for progress snapshots
+_open = set()
+
+def begin(client: Optional[str], pkg: dict, pkg_index: int, filename: str, file_size: int, start: int, end: int) -> Transfer:
+    """Registers a download request, joining the client's running session for the same package."""
+    global version
+    _retire()
+    key = (client or "unknown", pkg.get('file_path') or str(pkg_index))
+    session = _sessions.get(key)
+    if session is None:
+        session = _sessions[key] = Session(key[0], pkg, pkg_index, filename, file_size)
+    session.requests += 1; session.active_requests += 1
+    session.ranges.append((start, end)); session.last_activity = time.time()
+    transfer = Transfer(session, start)
+    _open.add(transfer)
+    version += 1
+    return transfer
+
+def _retire():
+    """Moves sessions that have been idle for SESSION_IDLE_SECONDS to the history."""
+    global version
+    now = time.time()
+    for key, session in list(_sessions.items()):
+        if session.active_requests or now - session.last_activity < SESSION_IDLE_SECONDS: continue
+        del _sessions[key]
+        if session.file_size and session.covered_bytes() >= session.file_size: session.status = "completed"
+        elif session.outcome in ("cancelled", "failed"): session.status = session.outcome
+        else: session.status = "incomplete"
+        session.ended = session.last_activity
+        history.append(session.to_dict())
+        version += 1
+
+def snapshot() -> dict:
+    """This process' sessions and history (oldest first), plus its version."""
+    _retire()
+    open_intervals = {}
+    for transfer in _open:
+        if transfer.pos > transfer.start: open_intervals.setdefault(transfer.session.id, []).append([transfer.start, transfer.pos])
+    sessions = []
+    for session in sorted(_sessions.values(), key=lambda s: s.started):
+        entry = session.to_dict(open_intervals.get(session.id, ()))
+        if not session.active_requests: entry["status"] = "idle"
+        sessions.append(entry)
+    return {"active": sessions, "history": list(history), "version": version}
+
+def get_downloads(others: Iterable[dict] = ()) -> dict:
+    """Our downloads, merged with the snapshot() of other workers."""
+    snapshots = [snapshot()] + list(others)
+    sessions = sorted((entry for snap in snapshots for entry in snap["active"]), key=lambda entry: entry["started"])
+    finished = sorted((entry for snap in snapshots for entry in snap["history"]), key=lambda entry: entry["last_activity"])[-HISTORY_SIZE:]
+    completed = [entry for entry in finished if entry["status"] == "completed"]
+    return {
+        "active": sessions, "history": finished[::-1],
+        "summary": {
+            "active": sum(1 for entry in sessions if entry["active_requests"]),
+            "rate_bps": sum(entry["rate_bps"] for entry in sessions),
+            "finished": len(finished), "completed": len(completed),
+            "history_bytes": sum(entry["bytes_sent"] for entry in finished),
+            "avg_completed_rate_bps": round(sum(entry["avg_rate_bps"] or 0 for entry in completed) / len(completed)) if completed else None,
+        },
+    }
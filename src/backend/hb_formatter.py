@@ -36,11 +36,22 @@ def _chunk_description(text: str, line_length: int = 150) -> list:
         
     return lines
 
-def create_hb_store_item(pkg_data: dict, base_uri: str, pid: int = 1) -> dict:
+# --- Store item cache ---
+# Formatting an item (description chunking, version/title lookups) only depends on the
+# package metadata, so items are formatted once per package version and cached as
+# templates. The base URI and pid are filled in at publish time by resolve_store_item.
+_SIGNATURE_FIELDS = (
+    "file_size", "file_mtime", "TITLE", "TITLE_ID", "CONTENT_ID", "apptype", "APP_VER",
+    "VERSION", "icon_url", "SIZE", "rating", "publisher", "release_date",
+)
+_item_cache = {} # file_path -> (signature, template)
+cache_stats = {"hits": 0, "misses": 0}
+
+def _format_item_template(pkg_data) -> dict:
     title_id = pkg_data.get("TITLE_ID", "N/A"); content_id = pkg_data.get("CONTENT_ID", title_id)
     apptype = pkg_data.get("apptype", "Unknown")
     version = pkg_data.get("APP_VER") if apptype == "Patch" else pkg_data.get("VERSION", "01.00")
-    package_url = f"{base_uri}/api/download/{pid}"; icon_url = pkg_data.get("icon_url", ""); file_size = pkg_data.get("SIZE", "N/A")
+    icon_url = pkg_data.get("icon_url", ""); file_size = pkg_data.get("SIZE", "N/A")
     
     # --- MODIFIED: Use the new chunking helper ---
     full_description = pkg_data.get("description", "")
@@ -50,11 +61,12 @@ def create_hb_store_item(pkg_data: dict, base_uri: str, pid: int = 1) -> dict:
     desc_line_2 = desc_lines[1] if len(desc_lines) > 1 else ""
     desc_line_3 = desc_lines[2] if len(desc_lines) > 2 else ""
 
-    item = {
-        "pid": pid, "id": title_id, "name": pkg_data.get("TITLE", "No Title"),
+    # "image", "package" and "main_icon_path" are relative here, see resolve_store_item
+    return {
+        "pid": None, "id": title_id, "name": pkg_data.get("TITLE", "No Title"),
         "desc": desc_line_1, # Line 1
-        "image": f"{base_uri}{icon_url}" if icon_url else "",
-        "package": package_url, "version": version,
+        "image": icon_url or "",
+        "package": None, "version": version,
         "picpath": f"/user/app/NPXS39041/storedata/{content_id}.png",
         "desc_1": desc_line_2, # Line 2
         "desc_2": desc_line_3, # Line 3
@@ -62,8 +74,41 @@ def create_hb_store_item(pkg_data: dict, base_uri: str, pid: int = 1) -> dict:
         "Size": file_size,
         "Author": pkg_data.get("publisher", "HB-Store CDN"),
         "apptype": apptype, "pv": "5.05+",
-        "main_icon_path": f"{base_uri}{icon_url}" if icon_url else "",
+        "main_icon_path": icon_url or "",
         "main_menu_pic": f"/user/app/NPXS39041/storedata/{content_id}.png",
         "releaseddate": pkg_data.get("release_date", "2024-01-01"),
     }
+
+def get_store_item_template(pkg_data) -> dict:
+    """Returns the cached template for a package, formatting it only if its metadata changed."""
+    file_path = pkg_data.get("file_path")
+    signature = tuple(pkg_data.get(field) for field in _SIGNATURE_FIELDS)
+    cached = _item_cache.get(file_path) if file_path else None
+    if cached and cached[0] == signature:
+        cache_stats["hits"] += 1
+        return cached[1]
+    cache_stats["misses"] += 1
+    template = _format_item_template(pkg_data)
+    if file_path: _item_cache[file_path] = (signature, template)
+    return template
+
+def resolve_store_item(template: dict, base_uri: str, pid: int) -> dict:
+    """Fills in the base URI dependent fields of a cached template."""
+    item = dict(template)
+    item["pid"] = pid
+    item["package"] = f"{base_uri}/api/download/{pid}"
+    if item["image"]: item["image"] = f"{base_uri}{item['image']}"
+    if item["main_icon_path"]: item["main_icon_path"] = f"{base_uri}{item['main_icon_path']}"
     return item
+
+def prune_item_cache(live_paths):
+    """Drops cached templates of packages that are no longer in the library."""
+    live = set(live_paths)
+    # list() copies the keys in one step; store views may add templates from another thread meanwhile
+    for file_path in [path for path in list(_item_cache) if path not in live]: _item_cache.pop(file_path, None)
+
+def clear_item_cache():
+    _item_cache.clear()
+
+def create_hb_store_item(pkg_data: dict, base_uri: str, pid: int = 1) -> dict:
+    return resolve_store_item(get_store_item_template(pkg_data), base_uri, pid)
@@ -0,0 +1,95 @@
+# backend/hot_cache.py
+#
+# In-memory cache for the tiny files every console polls on boot (store.db, the
+# /update/ binaries). Each entry holds the bytes, the MD5 (used as ETag and as the
+# /api.php hash) and a gzip variant, so a polling storm is answered from RAM with
+# no disk access, and If-None-Match requests get a 304.
+#
+# Every lookup costs one os.stat: an entry whose file changed size, mtime or inode
+# is reloaded, so a file rewritten by another worker process (store.db publish,
+# binary updater) is never served stale. invalidate() drops entries right away.
+
+import os
+import gzip
+import hashlib
+import threading
+from email.utils import formatdate
+from typing import NamedTuple, Optional
+from fastapi import Request
+from fastapi.responses import Response
+
+# Files above this size are not cached (served from disk instead)
+MAX_FILE_SIZE = 32 * 1024 * 1024
+# Only keep a gzip variant if it saves at least this much
+MIN_GZIP_SAVING = 0.1
+
+class HotFile(NamedTuple):
+    data: bytes
+    md5: str
+    etag: str
+    gzip_data: Optional[bytes]
+    last_modified: str
+    stat_key: tuple # (size, mtime_ns, inode) the entry was loaded from
+
+_entries = {}
+_lock = threading.Lock()
+
+def _stat_key(st: os.stat_result) -> tuple:
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+def _load(path: str, st: os.stat_result) -> Optional[HotFile]:
+    try:
+        if st.st_size > MAX_FILE_SIZE: return None
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    md5 = hashlib.md5(data).hexdigest()
+    compressed = gzip.compress(data, compresslevel=6, mtime=0) if data else None
+    if compressed is not None and len(compressed) > len(data) * (1 - MIN_GZIP_SAVING): compressed = None
+    return HotFile(data=data, md5=md5, etag=f'"{md5}"', gzip_data=compressed, last_modified=formatdate(st.st_mtime, usegmt=True), stat_key=_stat_key(st))
+
+def get(path: str) -> Optional[HotFile]:
+    """Returns the cached file, (re)loading it if it is new or changed on disk. None if missing or too big."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        invalidate(path); return None
+    entry = _entries.get(path)
+    if entry is None or entry.stat_key != _stat_key(st):
+        entry = _load(path, st)
+        with _lock:
+            if entry is None: _entries.pop(path, None)
+            else: _entries[path] = entry
+    return entry
+
+def invalidate(path: str = None):
+    """Drops one file (or everything) from the cache after it was rewritten."""
+    with _lock:
+        if path is None: _entries.clear()
+        else: _entries.pop(path, None)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if not if_none_match: return False
+    if if_none_match.strip() == '*': return True
+    return etag in (tag.strip().removeprefix('W/') for tag in if_none_match.split(','))
+
+def respond(request: Request, path: str, filename: str = None) -> Optional[Response]:
+    """
+    Builds the response for a cached file: 304 if the client's ETag matches,
+    gzip if accepted, headers only for HEAD. Returns None if the file can't be cached.
+    """
+    entry = get(path)
+    if entry is None: return None
+    headers = {'ETag': entry.etag, 'Last-Modified': entry.last_modified, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if filename: headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    body = entry.data
+    if entry.gzip_data is not None and 'gzip' in request.headers.get('accept-encoding', ''):
+        body = entry.gzip_data; headers['Content-Encoding'] = 'gzip'
+    if request.method == 'HEAD':
+        headers['Content-Length'] = str(len(body))
+        return Response(headers=headers, media_type='application/octet-stream')
+    return Response(content=body, headers=headers, media_type='application/octet-stream')
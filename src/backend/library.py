@@ -0,0 +1,170 @@
+# backend/library.py
+#
+# Multi-root package library. Every root (local SSD cache, NAS share, USB archive...)
+# is scanned independently with its own I/O concurrency, so a slow root never holds
+# up the indexing of a fast one. When the same package exists on several roots it is
+# listed once and downloads are served from the preferred (lowest priority number) root.
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple
+from . import catalog_index, dir_walker, pkg_manager
+from .package_record import PackageRecord
+
+# How often a root with watch mode enabled is checked for changes (seconds).
+WATCH_POLL_SECONDS = 30
+
+class LibraryRoot(NamedTuple):
+    path: str
+    priority: int = 0         # Lower numbers are read first, e.g. 0 = local SSD, 10 = USB archive
+    scan_interval: int = 0    # Incremental rescan every N seconds, 0 = only on startup / manual scans
+    watch: bool = False       # Poll the directory tree every WATCH_POLL_SECONDS and pick up changes
+    io_concurrency: int = 2   # Max. number of PKG files read from this root at once
+
+def get_roots(config: dict) -> List[LibraryRoot]:
+    """
+    Builds the list of library roots from the server config. The legacy single
+    'base_path' setting is still honoured and becomes a root of its own.
+    """
+    roots, seen = [], set()
+    for entry in config.get("library_roots") or []:
+        if isinstance(entry, str): entry = {"path": entry}
+        path = entry.get("path")
+        if not path or os.path.normcase(os.path.abspath(path)) in seen: continue
+        seen.add(os.path.normcase(os.path.abspath(path)))
+        roots.append(LibraryRoot(
+            path=path,
+            priority=int(entry.get("priority", 0)),
+            scan_interval=int(entry.get("scan_interval", 0)),
+            watch=bool(entry.get("watch", False)),
+            io_concurrency=max(1, int(entry.get("io_concurrency", 2))),
+        ))
+    base_path = config.get("base_path")
+    if base_path and os.path.normcase(os.path.abspath(base_path)) not in seen:
+        roots.append(LibraryRoot(path=base_path))
+    return sorted(roots, key=lambda root: root.priority)
+
+def scan_root(root: LibraryRoot, previous: list = None, full: bool = False) -> list:
+    """
+    Scans a single root, reading at most root.io_concurrency PKG files in parallel.
+    Packages from a previous scan whose size and mtime did not change are reused
+    as-is. If nothing changed at all, the previous list itself is returned.
+    Full metadata goes to the catalog index; the returned list holds compact records.
+    """
+    if not os.path.isdir(root.path):
+        print(f"--- WARNING: Library root '{root.path}' not found. ---"); return []
+    print(f"\n[*] Starting {'full' if full else 'incremental'} scan in library root: {root.path} (priority {root.priority})")
+    walk_result = dir_walker.walk(root.path, full=full)
+    if previous is not None and not walk_result.changed:
+        print(f"[*] Library root '{root.path}' is unchanged."); return previous
+
+    previous_by_path = {pkg['file_path']: pkg for pkg in previous or []}
+    packages, to_process = [], []
+    for path, size, mtime_ns in walk_result.files:
+        old = previous_by_path.get(path)
+        if old and old.get('file_size') == size and old.get('file_mtime') == mtime_ns:
+            packages.append(old)
+        else:
+            packages.append(None); to_process.append((len(packages) - 1, path, size, mtime_ns))
+
+    icon_cache_dir = pkg_manager.get_icon_cache_dir()
+    def _process(job):
+        _, path, size, mtime_ns = job
+        pkg = pkg_manager.process_pkg_file(path, icon_cache_dir, file_size=size)
+        if pkg: pkg['file_mtime'] = mtime_ns; pkg['library_root'] = root.path
+        return pkg
+    processed = []
+    with ThreadPoolExecutor(max_workers=root.io_concurrency) as pool:
+        for job, pkg in zip(to_process, pool.map(_process, to_process)):
+            if pkg: processed.append(pkg); packages[job[0]] = PackageRecord.from_metadata(pkg)
+    catalog_index.save_packages(processed)
+    packages = [pkg for pkg in packages if pkg]
+    catalog_index.prune_root(root.path, (pkg['file_path'] for pkg in packages))
+    print(f"[*] Library root '{root.path}' done. Found {len(packages)} packages ({len(to_process)} new or changed).")
+    return packages
+
+def load_root_packages(roots: List[LibraryRoot], root_packages: Dict[str, list]):
+    """Fills root_packages from the catalog index, so the next scan only has to look at changes."""
+    for root in roots:
+        indexed = catalog_index.load_root(root.path)
+        if indexed: root_packages[root.path] = [PackageRecord.from_metadata(pkg) for pkg in indexed]
+
+def _package_key(pkg: dict):
+    """Identifies the same package on different roots."""
+    content_id = pkg.get('CONTENT_ID')
+    version = pkg.get('APP_VER') if pkg.get('apptype') == 'Patch' else pkg.get('VERSION')
+    if content_id: return (content_id, version, pkg.get('file_size'))
+    return (os.path.basename(pkg.get('file_path', '')).lower(), pkg.get('file_size'))
+
+def merge_roots(roots: List[LibraryRoot], root_packages: Dict[str, list]) -> list:
+    """
+    Merges the per-root scan results into one package list. Duplicates are listed
+    once; the copy on the preferred root becomes 'file_path' and the others are kept
+    in 'mirrors' (in priority order) as fallbacks for downloads.
+    """
+    merged, mirrors = [], {}
+    for root in roots:
+        for pkg in root_packages.get(root.path, []):
+            key = _package_key(pkg)
+            if key in mirrors:
+                mirrors[key].append(pkg['file_path']); continue
+            mirrors[key] = []; merged.append(pkg.copy())
+    for pkg in merged: pkg['mirrors'] = tuple(mirrors[_package_key(pkg)])
+    duplicates = sum(len(paths) for paths in mirrors.values())
+    if duplicates: print(f"[*] {duplicates} packages are mirrored on more than one library root.")
+    return pkg_manager.post_process_packages(merged)
+
+def resolve_file_path(pkg: dict):
+    """Returns (path, size, mtime_ns) from the first (fastest) root that currently has the package."""
+    for path in [pkg.get('file_path')] + list(pkg.get('mirrors') or []):
+        stat = dir_walker.get_stat(path) if path else None
+        if stat: return (path,) + stat
+    return None
+
+async def scan_roots(roots: List[LibraryRoot], root_packages: Dict[str, list], on_update: Callable[[list], None], full: bool = False) -> bool:
+    """
+    Scans all roots concurrently. Every time a root finishes with changes, its
+    results are stored in root_packages and the merged list is handed to on_update,
+    so fast roots are served while slow ones are still being indexed. on_update runs
+    in a worker thread (it usually rebuilds store.db). Returns False if no root changed.
+    """
+    changed = False
+    async def _scan(root: LibraryRoot):
+        nonlocal changed
+        previous = root_packages.get(root.path)
+        packages = await asyncio.to_thread(scan_root, root, previous, full)
+        if packages is previous: return
+        root_packages[root.path] = packages; changed = True
+        await asyncio.to_thread(on_update, merge_roots(roots, root_packages))
+    removed = set(root_packages) - {root.path for root in roots}
+    for stale in removed: del root_packages[stale]
+    await asyncio.gather(*(_scan(root) for root in roots))
+    if removed and not changed:
+        await asyncio.to_thread(on_update, merge_roots(roots, root_packages))
+    return changed or bool(removed)
+
+async def watch_root(root: LibraryRoot, get_roots_fn: Callable[[], List[LibraryRoot]], root_packages: Dict[str, list], on_update: Callable[[list], None], lock: asyncio.Lock):
+    """
+    Background loop that rescans a root on its schedule (and every WATCH_POLL_SECONDS
+    in watch mode). Scans are incremental, so an unchanged tree costs one stat per directory.
+    Each rescan holds lock, the one manual scans use, so they never run at the same time.
+    """
+    intervals = ([WATCH_POLL_SECONDS] if root.watch else []) + ([root.scan_interval] if root.scan_interval > 0 else [])
+    if not intervals: return
+    while True:
+        await asyncio.sleep(min(intervals))
+        try:
+            async with lock:
+                # The root may have been dropped from the config while we waited for a manual scan
+                if root.path not in {other.path for other in get_roots_fn()}: return
+                previous = root_packages.get(root.path)
+                packages = await asyncio.to_thread(scan_root, root, previous)
+                if packages is previous: continue
+                print(f"--- Library root '{root.path}' changed on disk. ---")
+                root_packages[root.path] = packages
+                await asyncio.to_thread(on_update, merge_roots(get_roots_fn(), root_packages))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Scheduled scan of '{root.path}' failed: {e}")
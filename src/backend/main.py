@@ -1,21 +1,45 @@
 # backend/main.py (Final version with server-side config persistence)
 
 import os
+import asyncio
 import uvicorn
 import hashlib
 import anyio
+import gzip
+import zlib
+import sqlite3
 # --- NEW: Import json for handling the config file ---
 import json
-from fastapi import FastAPI, HTTPException, Request
+import time
+import shutil
+import tempfile
+import threading
+from email.utils import formatdate
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from . import pkg_manager, ps4_ftp_client, hb_formatter, db_manager, binary_updater
+from typing import List, Optional
+from . import catalog_archive, catalog_index, console_inventory, download_sessions, hot_cache, library, peer_cache, pkg_manager, read_ahead, worker_role, package_record, hb_formatter, db_manager, binary_updater, metadata_sources, store_history, store_views, title_db
 
 # --- NEW: Define path for the configuration file ---
 CONFIG_PATH = 'config.json'
 
+# Secondary workers check this often whether the primary published a new catalog
+CATALOG_POLL_SECONDS = 2
+
+# Secondary workers give up waiting for an action they handed to the primary after this long
+PRIMARY_ACTION_TIMEOUT = 1800
+
+# The download event feed sends at most one update this often
+DOWNLOAD_EVENTS_INTERVAL = 1
+DOWNLOAD_EVENTS_KEEPALIVE = 15
+
+# Library scans, binary updates etc. start this long after startup, once the server is listening
+STARTUP_REFRESH_DELAY = 1
+
 # --- Application Setup ---
 app = FastAPI(title="PS4 CDN Server")
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
@@ -26,73 +50,414 @@ server_state = {
     # --- MODIFIED: Default config structure ---
     "config": {
         "base_path": "", # Default, will be overridden by config.json
+        "library_roots": [], # Extra roots: {"path", "priority", "scan_interval", "watch", "io_concurrency"}
         "ps4_ip": "",
-        "ps4_port": 2121
+        "ps4_port": 2121,
+        "store_profiles": [], # Per-console store.db filters, see store_views.py
+        "discovery_subnet": "", # e.g. "192.168.1.0/24", scanned for consoles in the background
+        "discovery_interval": 600,
+        "health_interval": 60,
+        "metadata_providers": ["title_db", "scraper"], # Tried in order, see metadata_sources.py
+        "metadata_locales": ["en-US"],
+        "upstream_url": "", # Pull-through mode: mirror and cache another CDN server, see peer_cache.py
+        "peer_cache_dir": "",
+        "peer_cache_max_gb": 100,
+        "upstream_poll_interval": 60,
+        "warm_cache": True, # Pre-load popular packages into the page cache while idle, see read_ahead.py
+        "warm_max_gb": 4,
+        "warm_top_n": 20
     },
-    "db_initialized": False # Use a boolean, not a string
+    "db_initialized": False, # Use a boolean, not a string
+    "root_packages": {}, # Latest scan results per library root path
+    "base_uri": None, # Last base URL seen from a client, used for background DB refreshes
+    "catalog_version": 0, # Bumped on every store.db rebuild, invalidates the per-console views
+    "config_mtime": None
 }
+_root_watchers = []
+_background_tasks = []
+# Startup, manual and import scans run one at a time
+_scan_lock = asyncio.Lock()
+# Scans of different roots publish from worker threads; store.db is rebuilt by one at a time
+_publish_lock = threading.Lock()
+# Set when a proxied download finds the upstream catalog changed under us
+_upstream_resync = asyncio.Event()
+# Secondaries: store.db/api.php hits not yet handed to the primary's console inventory, [ip, kind, time]
+_pending_fetches = []
+# Secondaries: download starts not yet handed to the primary's popularity ranking, [file_path, time]
+_pending_downloads = []
 
 # --- Pydantic Models ---
 class ScanRequest(BaseModel): base_path: str
 class PS4ConnectionInfo(BaseModel): ps4_ip: str; ps4_port: int = 2121
 class UpdateCDNRequest(PS4ConnectionInfo): new_cdn_url: str
+class ProvisionRequest(BaseModel):
+    targets: List[str] = [] # IPs, hostnames or subnets like "192.168.1.0/24". Empty = all reachable known consoles
+    ps4_port: int = 2121
+    new_cdn_url: str
+    timeout: float = 5
+    concurrency: int = 16
+    skip_offline: bool = True # Skip consoles the health poller saw offline within the last health interval
+class DiscoverRequest(BaseModel): subnet: Optional[str] = None
 
 # --- NEW: Pydantic model for saving the configuration ---
+class LibraryRootConfig(BaseModel):
+    path: str
+    priority: int = 0
+    scan_interval: int = 0
+    watch: bool = False
+    io_concurrency: int = 2
+
+class StoreProfileConfig(BaseModel):
+    name: str
+    clients: List[str] = []
+    token: Optional[str] = None
+    apptypes: Optional[List[str]] = None
+    max_parental_level: Optional[int] = None
+    max_sys_ver: Optional[str] = None
+    regions: Optional[List[str]] = None
+
 class ConfigUpdateRequest(BaseModel):
     base_path: str
     ps4_ip: str
     ps4_port: int
+    library_roots: Optional[List[LibraryRootConfig]] = None
+    store_profiles: Optional[List[StoreProfileConfig]] = None
+    metadata_providers: Optional[List[str]] = None
+    metadata_locales: Optional[List[str]] = None
 
 # --- Core Application Logic ---
 
 @app.on_event("startup")
 async def startup_event():
     print("--- Server is starting up! ---")
-    
+    _load_config()
+    # Every worker starts from the last published catalog; only the primary scans
+    _load_published_catalog()
+
+    db_path = db_manager.DB_PATH
+    if os.path.exists(db_path):
+        print("--- Found existing store.db. Will not rebuild on this run. ---")
+        server_state["db_initialized"] = True
+
+    # Consoles are served from the published catalog right away; the refresh work runs in the background
+    is_primary = worker_role.try_become_primary() or not worker_role.is_multi_worker()
+    if worker_role.is_multi_worker():
+        _background_tasks.append(asyncio.create_task(_share_worker_state()))
+    if is_primary:
+        _background_tasks.append(asyncio.create_task(_start_primary_services(delay=STARTUP_REFRESH_DELAY)))
+    else:
+        print(f"--- Secondary worker (pid {os.getpid()}): serving the published catalog of {len(server_state['packages'])} packages. ---")
+        _background_tasks.append(asyncio.create_task(_follow_primary()))
+
+def _load_config():
     # --- NEW: Load configuration from file ---
     if os.path.exists(CONFIG_PATH):
         print(f"[*] Found {CONFIG_PATH}, loading settings.")
         with open(CONFIG_PATH, 'r') as f:
             # Use .update() to safely merge saved settings over defaults
             server_state['config'].update(json.load(f))
+        server_state["config_mtime"] = os.stat(CONFIG_PATH).st_mtime_ns
     else:
         print(f"[*] {CONFIG_PATH} not found, using default settings.")
+    metadata_sources.configure(server_state['config'])
+    peer_cache.configure(server_state['config'])
 
-    binary_updater.update_binaries()
+def _resolve_local_path(file_path: str) -> Optional[str]:
+    """Local path of a served package, for cache warming. None in pull-through mode or if it's gone."""
+    for pkg in server_state["packages"]:
+        if pkg.get('file_path') == file_path:
+            resolved = library.resolve_file_path(pkg)
+            return resolved[0] if resolved else None
+    return None
 
-    db_path = db_manager.DB_PATH
-    if os.path.exists(db_path):
-        print("--- Found existing store.db. Will not rebuild on this run. ---")
-        server_state["db_initialized"] = True
-    
-    base_path = server_state["config"]["base_path"]
-    if os.path.isdir(base_path):
-        print(f"Pre-scanning directory: {base_path}...")
-        server_state["packages"] = pkg_manager.scan_directory(base_path)
+def _load_published_catalog():
+    records, version, base_uri = catalog_index.load_published()
+    server_state["packages"] = [package_record.PackageRecord.from_metadata(record) for record in records]
+    server_state["catalog_version"] = version
+    server_state["base_uri"] = base_uri or server_state["base_uri"]
+    if records: print(f"[*] Loaded published catalog v{version} with {len(records)} packages from the index.")
+
+async def _start_primary_services(delay: float = 0):
+    """Scanning, store.db publishing and the background services only run in the primary worker."""
+    await asyncio.sleep(delay)
+    if worker_role.is_multi_worker():
+        print(f"--- Primary worker (pid {os.getpid()}) ---")
+        _background_tasks.append(asyncio.create_task(_serve_secondaries()))
+
+    # Runs in the background; consoles keep getting the binaries we already have meanwhile
+    binary_updater.add_update_listener(lambda names: [hot_cache.invalidate(os.path.join(binary_updater.BIN_DIR, name)) for name in names])
+    _background_tasks.append(asyncio.create_task(binary_updater.update_binaries_in_background()))
+    _background_tasks.append(asyncio.create_task(console_inventory.run_service(lambda: server_state["config"])))
+    # One warmer for the whole server (the page cache is shared); it waits while any worker streams
+    _background_tasks.append(asyncio.create_task(read_ahead.run_warmer(lambda: server_state["config"], _resolve_local_path, _other_worker_streams)))
+
+    if peer_cache.get_upstream():
+        print(f"--- Pull-through mode: mirroring the catalog of {peer_cache.get_upstream()} ---")
+        _background_tasks.append(asyncio.create_task(_follow_upstream())); return
+
+    roots = library.get_roots(server_state["config"])
+    if any(os.path.isdir(root.path) for root in roots):
+        # Known, unchanged PKGs come from the index and are not parsed/scraped again
+        scanned = []
+        def _on_scanned(packages: list):
+            # Keep serving the published list (its pids match store.db) until we republish
+            if server_state["db_initialized"]: scanned[:] = [packages]
+            else: _set_packages(packages)
+        async with _scan_lock:
+            try:
+                await asyncio.to_thread(library.load_root_packages, roots, server_state["root_packages"])
+                published = package_record.to_dicts(server_state["packages"], extra_keys=())
+                print(f"Pre-scanning {len(roots)} library root(s)...")
+                if not await library.scan_roots(roots, server_state["root_packages"], _on_scanned) and server_state["root_packages"]:
+                    scanned[:] = [await asyncio.to_thread(library.merge_roots, roots, server_state["root_packages"])]
+                if scanned and package_record.to_dicts(scanned[0], extra_keys=()) != published:
+                    print("--- Library changed since the last run. ---")
+                    await asyncio.to_thread(_publish_packages, scanned[0])
+                elif scanned:
+                    _set_packages(scanned[0])
+            except Exception as e:
+                print(f"[!] Startup scan failed, still serving the published catalog: {e}")
         
         if not server_state["db_initialized"]:
             print(f"--- Scan complete. {len(server_state['packages'])} packages found. DB will be built on first visit. ---")
         else:
             print(f"--- Scan complete. {len(server_state['packages'])} packages loaded into memory. ---")
     else:
-        print(f"--- WARNING: Configured base path '{base_path}' not found. ---")
+        print(f"--- WARNING: None of the configured library roots were found. ---")
+    _start_root_watchers()
+
+async def _follow_primary():
+    """Secondary workers: pick up catalogs and config published by the primary, take over if it exits."""
+    while True:
+        await asyncio.sleep(CATALOG_POLL_SECONDS)
+        try:
+            await _sync_published_catalog()
+            if _config_changed(): _load_config()
+            await _forward_records()
+            if worker_role.try_become_primary():
+                print(f"--- Worker {os.getpid()} is taking over as primary. ---")
+                await _start_primary_services(); return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Could not sync with the primary worker: {e}")
 
-def refresh_database(base_uri: str):
+async def _sync_published_catalog():
+    """Secondary workers: loads the catalog the primary published, if there is a newer one."""
+    if catalog_index.read_version() != server_state["catalog_version"]:
+        await asyncio.to_thread(_load_published_catalog)
+        server_state["db_initialized"] = os.path.exists(db_manager.DB_PATH)
+        hot_cache.invalidate()
+
+async def _share_worker_state():
+    """Multi-worker: writes what the other workers need to know about this one (its downloads and streams)."""
+    written, written_at = None, 0.0
+    while True:
+        await asyncio.sleep(worker_role.STATE_SECONDS)
+        try:
+            state = {"downloads": download_sessions.snapshot(), "read_ahead": read_ahead.shared_stats()}
+            # Unchanged state is rewritten now and then, so the others know we're alive
+            if state != written or time.monotonic() - written_at > worker_role.STATE_MAX_AGE / 2:
+                await asyncio.to_thread(worker_role.write_state, state)
+                written, written_at = state, time.monotonic()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Could not share the worker state: {e}")
+
+async def _other_worker_states() -> list:
+    return await asyncio.to_thread(worker_role.read_states) if worker_role.is_multi_worker() else []
+
+def _other_worker_streams() -> int:
+    if not worker_role.is_multi_worker(): return 0
+    return sum(state.get("read_ahead", {}).get("active_streams", 0) for state in worker_role.read_states())
+
+def _record_fetch(request: Request, kind: str):
+    """Records a store.db/api.php hit in the console inventory, which only the primary keeps."""
+    ip = request.client.host if request.client else None
+    if worker_role.is_primary(): console_inventory.record_fetch(ip, kind)
+    elif ip: _pending_fetches.append([ip, kind, time.time()])
+
+def _record_download(pkg):
+    """Counts a download start for cache warming, whose popularity ranking only the primary keeps."""
+    if worker_role.is_primary(): read_ahead.record_download(pkg, server_state["packages"])
+    elif pkg.get('file_path'): _pending_downloads.append([pkg['file_path'], time.time()])
+
+async def _forward_records():
+    """Secondary workers: posts the hits and download starts recorded since the last call to the primary."""
+    for name, pending in (("record_fetches", _pending_fetches), ("record_downloads", _pending_downloads)):
+        if not pending: continue
+        records = list(pending); pending.clear()
+        await asyncio.to_thread(worker_role.post_action, name, {"records": records})
+
+async def _record_fetches(records: list):
+    for ip, kind, when in records: console_inventory.record_fetch(ip, kind, when)
+
+async def _record_downloads(records: list):
+    by_path = {pkg.get('file_path'): pkg for pkg in server_state["packages"]}
+    for file_path, when in records:
+        if file_path in by_path: read_ahead.record_download(by_path[file_path], server_state["packages"], when)
+
+def _config_changed() -> bool:
+    return os.path.exists(CONFIG_PATH) and os.stat(CONFIG_PATH).st_mtime_ns != server_state["config_mtime"]
+
+async def _serve_secondaries():
+    """Primary worker: runs the actions secondaries forwarded and applies config.json saved by them."""
+    while True:
+        await asyncio.sleep(worker_role.ACTION_POLL_SECONDS)
+        try:
+            if _config_changed():
+                print(f"[*] {CONFIG_PATH} was changed by another worker, reloading.")
+                _load_config(); _start_root_watchers()
+            # Each action runs on its own, a long scan doesn't hold up the others (scans still queue on _scan_lock)
+            for action_id, name, params in await asyncio.to_thread(worker_role.take_actions):
+                _background_tasks.append(asyncio.create_task(_run_forwarded_action(action_id, name, params)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Could not serve forwarded actions: {e}")
+
+async def _run_forwarded_action(action_id: str, name: str, params: dict):
+    try:
+        status_code, content = 200, await PRIMARY_ACTIONS[name](**params)
+    except HTTPException as e:
+        status_code, content = e.status_code, {"detail": e.detail}
+    except Exception as e:
+        print(f"[!] Forwarded action '{name}' failed: {e}")
+        status_code, content = 500, {"detail": f"Action '{name}' failed: {e}"}
+    if action_id is not None: await asyncio.to_thread(worker_role.put_result, action_id, status_code, content)
+
+async def _run_on_primary(name: str, **params):
+    """Runs a scan/update action here if this is the primary worker, otherwise hands it to the primary."""
+    if worker_role.is_primary():
+        return await PRIMARY_ACTIONS[name](**params)
+    action_id = await asyncio.to_thread(worker_role.submit_action, name, params)
+    try:
+        result = await worker_role.wait_for_result(action_id, PRIMARY_ACTION_TIMEOUT)
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    if result["status_code"] != 200:
+        raise HTTPException(status_code=result["status_code"], detail=(result["content"] or {}).get("detail"))
+    # Answer with the catalog the primary just published
+    await _sync_published_catalog()
+    return result["content"]
+
+async def _follow_upstream():
+    """Pull-through mode: re-mirrors the upstream package list whenever its store.db changes."""
+    upstream_root = f"upstream:{peer_cache.get_upstream()}"
+    last_hash = None
+    while True:
+        try:
+            upstream_hash = await asyncio.to_thread(peer_cache.fetch_catalog_hash)
+            if upstream_hash != last_hash or _upstream_resync.is_set():
+                _upstream_resync.clear()
+                packages = await asyncio.to_thread(peer_cache.fetch_packages, pkg_manager.get_icon_cache_dir())
+                for pkg in packages: pkg['library_root'] = upstream_root
+                await asyncio.to_thread(catalog_index.save_packages, packages)
+                await asyncio.to_thread(catalog_index.prune_root, upstream_root, [pkg['file_path'] for pkg in packages])
+                # Same order as upstream, so our pids are the upstream pids
+                records = [package_record.PackageRecord.from_metadata(pkg) for pkg in packages]
+                if package_record.to_dicts(records, extra_keys=()) != package_record.to_dicts(server_state["packages"], extra_keys=()):
+                    print(f"--- Upstream catalog changed: {len(records)} packages. ---")
+                    await asyncio.to_thread(_publish_packages, records)
+                last_hash = upstream_hash
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Could not sync with upstream {peer_cache.get_upstream()}: {e}")
+        try:
+            await asyncio.wait_for(_upstream_resync.wait(), timeout=int(server_state["config"].get("upstream_poll_interval") or peer_cache.POLL_INTERVAL))
+        except asyncio.TimeoutError:
+            pass
+
+def _set_packages(packages: list):
+    server_state["packages"] = packages
+
+def _publish_packages(packages: list):
+    """Swaps in a new package list from a background scan and refreshes store.db if we can."""
+    with _publish_lock:
+        if server_state["base_uri"]:
+            refresh_database(server_state["base_uri"], packages)
+        else:
+            _set_packages(packages)
+            server_state["db_initialized"] = False
+
+def _start_root_watchers():
+    """(Re)starts the per-root background scan schedules."""
+    if not worker_role.is_primary() or peer_cache.get_upstream(): return
+    for task in _root_watchers: task.cancel()
+    _root_watchers.clear()
+    get_roots = lambda: library.get_roots(server_state["config"])
+    for root in get_roots():
+        if root.watch or root.scan_interval > 0:
+            _root_watchers.append(asyncio.create_task(library.watch_root(root, get_roots, server_state["root_packages"], _publish_packages, _scan_lock)))
+
+async def _rescan_library(base_uri: str, full: bool = False, reload_index: bool = False):
+    if peer_cache.get_upstream():
+        raise HTTPException(status_code=409, detail="This node mirrors an upstream server (pull-through mode) and has no library of its own.")
+    async with _scan_lock:
+        roots = library.get_roots(server_state["config"])
+        if reload_index or (not full and not server_state["root_packages"]):
+            await asyncio.to_thread(library.load_root_packages, roots, server_state["root_packages"])
+        # Every changed root is published right away: pids in store.db always match the served list
+        republish = reload_index or base_uri != server_state["base_uri"] or not server_state["db_initialized"] or not os.path.exists(db_manager.DB_PATH)
+        server_state["base_uri"] = base_uri
+        if not await library.scan_roots(roots, server_state["root_packages"], _publish_packages, full=full) and republish:
+            await asyncio.to_thread(_publish_packages, library.merge_roots(roots, server_state["root_packages"]))
+
+def _file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def refresh_database(base_uri: str, packages: list = None):
+    """Rebuilds store.db; a new package list is only swapped in once the matching store.db is written."""
     print(f"--- Refreshing database with base URI: {base_uri} ---")
-    formatted_packages = [
+    server_state["base_uri"] = base_uri
+    packages = server_state["packages"] if packages is None else packages
+    formatted_packages = (
         hb_formatter.create_hb_store_item(pkg, base_uri, pid=i + 1)
-        for i, pkg in enumerate(server_state["packages"])
-    ]
+        for i, pkg in enumerate(packages)
+    )
+    hits, misses = hb_formatter.cache_stats["hits"], hb_formatter.cache_stats["misses"]
     db_manager.create_db_from_packages(formatted_packages)
+    _set_packages(packages)
+    hot_cache.invalidate(db_manager.DB_PATH)
+    # Hashed separately: the hot cache skips files over hot_cache.MAX_FILE_SIZE
+    published = hot_cache.get(db_manager.DB_PATH)
+    store_history.record(db_manager.DB_PATH, published.md5 if published is not None else _file_md5(db_manager.DB_PATH))
+    print(f" -> Store items: {hb_formatter.cache_stats['misses'] - misses} formatted, {hb_formatter.cache_stats['hits'] - hits} reused from cache.")
+    hb_formatter.prune_item_cache(pkg.get("file_path") for pkg in server_state["packages"])
     server_state["db_initialized"] = True
+    # Persist the published list (pid order) and notify the other workers
+    server_state["catalog_version"] = catalog_index.save_published(package_record.to_dicts(server_state["packages"], extra_keys=()), base_uri)
+
+async def _resolve_store_db(request: Request, token: Optional[str] = None):
+    """
+    Returns (db_path, md5 or None) of the store.db this console should see:
+    its profile's view if one matches, otherwise the global store.db.
+    """
+    client_ip = request.client.host if request.client else None
+    profile = store_views.find_profile(server_state["config"], client_ip, token)
+    if profile is None:
+        if token is not None:
+            raise HTTPException(status_code=404, detail="Unknown store profile token.")
+        return db_manager.DB_PATH, None
+    base_uri = server_state["base_uri"] or str(request.base_url).rstrip('/')
+    db_path, file_hash = await store_views.get_view(profile, server_state["packages"], server_state["catalog_version"], base_uri)
+    if not db_path:
+        raise HTTPException(status_code=500, detail="Could not build store view.")
+    return db_path, file_hash
 
 # --- API Endpoints ---
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     if not server_state["db_initialized"] and server_state["packages"]:
-        base_url = str(request.base_url).rstrip('/')
-        refresh_database(base_url)
+        server_state["base_uri"] = str(request.base_url).rstrip('/')
+        await asyncio.to_thread(_publish_packages, server_state["packages"])
     
     # The server_state passed to the template now contains the loaded config
     return templates.TemplateResponse("index.html", {
@@ -103,15 +468,29 @@ async def read_root(request: Request):
 # --- NEW: Endpoint to save the configuration ---
 @app.post("/api/actions/save_config", summary="Saves the server configuration to config.json")
 async def save_config_endpoint(config_data: ConfigUpdateRequest):
+    unknown = [name for name in config_data.metadata_providers or [] if name not in metadata_sources.PROVIDERS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown metadata provider(s): {', '.join(unknown)}")
     try:
         # Update the config in memory
         server_state['config']['base_path'] = config_data.base_path
         server_state['config']['ps4_ip'] = config_data.ps4_ip
         server_state['config']['ps4_port'] = config_data.ps4_port
+        if config_data.library_roots is not None:
+            server_state['config']['library_roots'] = [root.model_dump() for root in config_data.library_roots]
+            _start_root_watchers()
+        if config_data.store_profiles is not None:
+            server_state['config']['store_profiles'] = [profile.model_dump() for profile in config_data.store_profiles]
+        if config_data.metadata_providers is not None:
+            server_state['config']['metadata_providers'] = config_data.metadata_providers
+        if config_data.metadata_locales is not None:
+            server_state['config']['metadata_locales'] = config_data.metadata_locales
+        metadata_sources.configure(server_state['config'])
         
         # Write the updated config to the file
         with open(CONFIG_PATH, 'w') as f:
             json.dump(server_state['config'], f, indent=4)
+        server_state["config_mtime"] = os.stat(CONFIG_PATH).st_mtime_ns
             
         print(f"[*] Configuration saved to {CONFIG_PATH}")
         return JSONResponse(content={"message": "Configuration saved successfully."})
@@ -120,28 +499,127 @@ async def save_config_endpoint(config_data: ConfigUpdateRequest):
 
 @app.get("/api/packages")
 async def get_all_packages():
-    return JSONResponse(content=server_state["packages"])
+    return JSONResponse(content=package_record.to_dicts(server_state["packages"]))
+
+async def _save_upload(file: UploadFile, suffix: str) -> str:
+    """Spools an uploaded file to a temp file (off the event loop) and returns its path."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, tmp)
+    return tmp.name
+
+@app.get("/api/title_db", summary="Number of titles in the local title database per locale and source")
+async def get_title_db_stats():
+    return JSONResponse(content=await asyncio.to_thread(title_db.get_stats))
+
+@app.post("/api/title_db/import", summary="Imports a JSON or CSV title dump into the local title database")
+async def import_title_db(file: UploadFile = File(...), locale: str = Form("en-US")):
+    tmp_path = await _save_upload(file, '.csv' if (file.filename or '').lower().endswith('.csv') else '.json')
+    try:
+        count = await asyncio.to_thread(title_db.import_file, tmp_path, locale)
+    except (ValueError, sqlite3.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read title dump: {e}")
+    finally:
+        os.remove(tmp_path)
+    return {"message": f"Imported {count} titles. New scans use them; a full rescan applies them to packages already indexed."}
+
+@app.get("/api/catalog/export", summary="Downloads the catalog index, icons and title database as one archive")
+async def export_catalog():
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp: pass
+    try:
+        await asyncio.to_thread(catalog_archive.export_archive, tmp.name)
+    except (OSError, sqlite3.Error) as e:
+        os.remove(tmp.name)
+        raise HTTPException(status_code=500, detail=f"Could not export catalog: {e}")
+    filename = f"ps4cdn-catalog-{time.strftime('%Y%m%d')}.db"
+    return FileResponse(path=tmp.name, media_type='application/octet-stream', filename=filename, background=BackgroundTask(os.remove, tmp.name))
+
+@app.post("/api/catalog/import", summary="Bootstraps the catalog from another node's archive; only files matching the local disk are used")
+async def import_catalog(request: Request, file: UploadFile = File(...), path_map: str = Form("")):
+    try:
+        mapping = catalog_archive.parse_path_map(path_map.replace(';', '\n').splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tmp_path = await _save_upload(file, '.db')
+    try:
+        stats = await asyncio.to_thread(catalog_archive.import_archive, tmp_path, mapping)
+    except (ValueError, sqlite3.Error, zlib.error) as e:
+        raise HTTPException(status_code=400, detail=f"Could not import catalog archive: {e}")
+    finally:
+        os.remove(tmp_path)
+    roots = library.get_roots(server_state["config"])
+    unconfigured = [path for path in stats["library_roots"] if path not in {root.path for root in roots}]
+    # Pick up the imported entries, then let the scan reuse them and parse only what differs
+    found = await _run_on_primary("reindex", base_uri=str(request.base_url).rstrip('/'))
+    return {
+        "message": f"Imported {stats['imported']} of {stats['packages']} packages. Found {found} packages.",
+        **stats, "unconfigured_roots": unconfigured,
+    }
+
+@app.get("/api/store_profiles", summary="Lists the per-console store profiles and their cached views")
+async def get_store_profiles():
+    return JSONResponse(content=store_views.get_status(server_state["config"], server_state["catalog_version"]))
 
 @app.api_route("/store.db", methods=["GET", "HEAD"])
-async def get_hb_store_db(request: Request):
-    db_path = db_manager.DB_PATH
+async def get_hb_store_db(request: Request, token: Optional[str] = None):
+    db_path, _ = await _resolve_store_db(request, token)
     if not os.path.exists(db_path):
         raise HTTPException(status_code=404, detail="store.db not found.")
     print("--- PS4 is requesting store.db ---")
-    return FileResponse(path=db_path, media_type='application/octet-stream', filename='store.db')
+    _record_fetch(request, "store.db")
+    # Served from RAM with ETag/304 support; falls back to disk if the DB is unusually large
+    return hot_cache.respond(request, db_path, filename='store.db') or FileResponse(path=db_path, media_type='application/octet-stream', filename='store.db')
 
 @app.get("/api.php", summary="Handle DB hash check from PS4")
-async def get_api_php(db_check_hash: bool = False):
+async def get_api_php(request: Request, db_check_hash: bool = False, token: Optional[str] = None):
     if db_check_hash:
-        db_path = db_manager.DB_PATH
+        db_path, file_hash = await _resolve_store_db(request, token)
         if not os.path.exists(db_path):
             raise HTTPException(status_code=404, detail="store.db not found for hashing.")
         print("--- PS4 is requesting store.db hash ---")
-        with open(db_path, "rb") as f:
-            file_hash = hashlib.md5(f.read()).hexdigest()
+        _record_fetch(request, "api.php")
+        if file_hash is None:
+            entry = hot_cache.get(db_path)
+            if entry is not None:
+                file_hash = entry.md5
+            else:
+                file_hash = await asyncio.to_thread(_file_md5, db_path)
         return JSONResponse(content={"hash": file_hash})
     return JSONResponse(content={"status": "ok"})
 
+@app.get("/api/store/versions", summary="store.db versions a delta can be requested from")
+async def get_store_versions():
+    versions = store_history.get_versions()
+    return JSONResponse(content={"current": versions[-1] if versions else None, "versions": versions})
+
+@app.get("/api/store/delta", summary="Row-level delta from a known store.db hash to the current one")
+async def get_store_delta(request: Request, from_hash: str = Query(..., alias="from")):
+    try:
+        data = await asyncio.to_thread(store_history.get_delta_gzip, from_hash)
+    except (sqlite3.Error, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Could not compute delta: {e}")
+    if data is None:
+        raise HTTPException(status_code=404, detail="Unknown store.db version, download the full /store.db instead.")
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        return Response(content=data, media_type='application/json', headers={'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+    return Response(content=gzip.decompress(data), media_type='application/json', headers={'Vary': 'Accept-Encoding'})
+
+# --- Token-prefixed routes: set the console's CDN to http://<server>:8000/p/<token> ---
+@app.api_route("/p/{token}/store.db", methods=["GET", "HEAD"])
+async def get_profile_store_db(token: str, request: Request):
+    return await get_hb_store_db(request, token)
+
+@app.get("/p/{token}/api.php")
+async def get_profile_api_php(token: str, request: Request, db_check_hash: bool = False):
+    return await get_api_php(request, db_check_hash, token)
+
+@app.get("/p/{token}/download.php")
+async def handle_profile_download_check(token: str, tid: str = "", check: bool = False):
+    return await handle_download_check(tid, check)
+
+@app.api_route("/p/{token}/update/{filename:path}", methods=["GET", "HEAD"])
+async def get_profile_update_file(token: str, filename: str, request: Request):
+    return await get_update_file(filename, request)
+
 @app.get("/download.php", summary="Handle pre-download check from PS4")
 async def handle_download_check(tid: str = "", check: bool = False):
     if check and tid:
@@ -149,46 +627,142 @@ async def handle_download_check(tid: str = "", check: bool = False):
         return JSONResponse(content={"status": "ok"})
     raise HTTPException(status_code=400, detail="Invalid request to download.php")
 
+def _parse_range(range_header: Optional[str], size: int):
+    """
+    Parses a single 'bytes=start-end' / 'bytes=start-' / 'bytes=-suffix' range into
+    inclusive (start, end). Returns None for no, malformed or multi-range headers
+    (served as a full 200), raises ValueError if the range can't be satisfied.
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header: return None
+    first, _, last = range_header[len('bytes='):].strip().partition('-')
+    try:
+        if first == '':
+            start, end = size - int(last), size - 1
+        else:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    if start < 0: start = 0
+    if start > end or start >= size: raise ValueError("Range not satisfiable.")
+    return start, end
+
 @app.api_route("/api/download/{pkg_index}", methods=["GET", "HEAD"], summary="Download a PKG file")
 async def download_pkg(pkg_index: int, request: Request):
     try:
         pkg = server_state["packages"][pkg_index - 1]
     except (IndexError, TypeError):
         raise HTTPException(status_code=404, detail=f"Package with index {pkg_index} not found.")
-    if not pkg or not os.path.exists(pkg.get("file_path")):
-        raise HTTPException(status_code=404, detail="Package file path not found or invalid.")
-    file_path = pkg["file_path"]
-    filename = os.path.basename(file_path)
-    file_size = os.path.getsize(file_path)
-    headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'Content-Length': str(file_size)}
+    if peer_cache.get_upstream() and pkg:
+        # Pull-through mode: the file lives upstream, size and mtime come from its catalog
+        file_path, file_size, mtime_ns = None, int(pkg.get('file_size') or 0), int(pkg.get('file_mtime') or 0)
+        filename = peer_cache.remote_filename(pkg.get('file_path'))
+    else:
+        resolved = library.resolve_file_path(pkg) if pkg else None
+        if not resolved:
+            raise HTTPException(status_code=404, detail="Package file path not found or invalid.")
+        # Size and mtime come from the walker's stat cache, no extra round trip to the share
+        file_path, file_size, mtime_ns = resolved
+        filename = os.path.basename(file_path)
+    etag, last_modified = f'"{file_size:x}-{mtime_ns:x}"', formatdate(mtime_ns / 1e9, usegmt=True)
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"', 'Content-Length': str(file_size),
+        'ETag': etag, 'Last-Modified': last_modified, 'Accept-Ranges': 'bytes',
+    }
+    # Resumed downloads (and the pull-through cache) ask for byte ranges
+    try:
+        byte_range = _parse_range(request.headers.get('range'), file_size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{file_size}'})
+    if byte_range and request.headers.get('if-range') not in (None, etag, last_modified):
+        byte_range = None # The file changed since the client's first part, send all of it
+    start, end = byte_range or (0, file_size - 1)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{file_size}'; headers['Content-Length'] = str(end - start + 1)
     if request.method == "HEAD":
         print(f"--- PS4 is requesting headers for package: {filename} ---")
-        return Response(headers=headers, media_type='application/octet-stream')
+        return Response(status_code=status_code, headers=headers, media_type='application/octet-stream')
     async def file_iterator(path: str):
+        transfer = download_sessions.begin(request.client.host if request.client else None, pkg, pkg_index, filename, file_size, start, end)
+        outcome = "cancelled" # Unless the loop runs to the end; a disconnect can also just close the generator
         try:
-            async with await anyio.open_file(path, "rb") as f:
-                while chunk := await f.read(1024 * 1024): yield chunk
+            source = peer_cache.stream(pkg, pkg_index, start, end) if path is None else read_ahead.stream_file(path, start, end)
+            async for chunk in source:
+                yield chunk; transfer.sent(len(chunk))
+            outcome = "done"
         except anyio.get_cancelled_exc_class():
             print(f"--- Download cancelled by client for: {filename} ---")
+        except peer_cache.UpstreamMismatch as e:
+            print(f"[!] {e} Re-mirroring the upstream catalog.")
+            _upstream_resync.set(); outcome = "failed"
         except Exception as e:
-            print(f"An error occurred during file streaming for {filename}: {e}")
-    print(f"--- PS4 is starting download for package: {filename} ---")
-    return StreamingResponse(file_iterator(file_path), media_type='application/octet-stream', headers=headers)
-
-@app.get("/update/{filename:path}")
-async def get_update_file(filename: str):
-    file_path = os.path.join(binary_updater.BIN_DIR, filename)
-    if not file_path.startswith(binary_updater.BIN_DIR):
+            print(f"An error occurred during file streaming for {filename}: {e}"); outcome = "failed"
+        finally:
+            transfer.finish(outcome)
+    # Resumed parts of a download don't count as another download
+    if start == 0: _record_download(pkg)
+    print(f"--- PS4 is starting download for package: {filename}{f' (bytes {start}-{end})' if byte_range else ''} ---")
+    return StreamingResponse(file_iterator(file_path), status_code=status_code, media_type='application/octet-stream', headers=headers)
+
+@app.get("/api/downloads", summary="Running downloads per console and the recent download history")
+async def get_downloads():
+    others = [state["downloads"] for state in await _other_worker_states() if "downloads" in state]
+    return JSONResponse(content=download_sessions.get_downloads(others))
+
+@app.get("/api/downloads/events", summary="Server-sent events with the download list, for the web UI")
+async def download_events(request: Request):
+    async def event_stream():
+        sent_version, last_sent = None, 0.0
+        while not await request.is_disconnected():
+            others = [state["downloads"] for state in await _other_worker_states() if "downloads" in state]
+            downloads = download_sessions.get_downloads(others)
+            # Running downloads change every second (rate, progress); otherwise only send changes and a keep-alive
+            versions = [download_sessions.version] + [other["version"] for other in others]
+            if downloads["summary"]["active"] or versions != sent_version:
+                sent_version, last_sent = versions, time.monotonic()
+                yield f"data: {json.dumps(downloads)}\n\n"
+            elif time.monotonic() - last_sent > DOWNLOAD_EVENTS_KEEPALIVE:
+                last_sent = time.monotonic(); yield ": keep-alive\n\n"
+            await asyncio.sleep(DOWNLOAD_EVENTS_INTERVAL)
+    return StreamingResponse(event_stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.get("/api/peer_cache", summary="Pull-through cache usage and how much was served locally")
+async def get_peer_cache_status():
+    if not peer_cache.get_upstream():
+        return JSONResponse(content={"upstream_url": None})
+    return JSONResponse(content=await asyncio.to_thread(peer_cache.get_status))
+
+@app.get("/api/read_ahead", summary="Page-cache warming, popular packages and how much was served warm")
+async def get_read_ahead_status():
+    return JSONResponse(content=await _run_on_primary("read_ahead"))
+
+async def _read_ahead():
+    others = [state["read_ahead"] for state in await _other_worker_states() if "read_ahead" in state]
+    return read_ahead.get_stats(others=others)
+
+@app.api_route("/update/{filename:path}", methods=["GET", "HEAD"])
+async def get_update_file(filename: str, request: Request):
+    file_path = os.path.normpath(os.path.join(binary_updater.BIN_DIR, filename))
+    if not file_path.startswith(binary_updater.BIN_DIR + os.sep):
         raise HTTPException(status_code=403, detail="Forbidden")
-    if os.path.exists(file_path):
-        print(f"--- PS4 is requesting update file: {filename} ---")
-        return FileResponse(path=file_path, media_type='application/octet-stream')
-    else:
+    response = hot_cache.respond(request, file_path)
+    if response is None and os.path.exists(file_path):
+        response = FileResponse(path=file_path, media_type='application/octet-stream')
+    if response is None:
         raise HTTPException(status_code=404, detail=f"Update file '{filename}' not found.")
+    print(f"--- PS4 is requesting update file: {filename} ---")
+    return response
 
 @app.post("/api/actions/full_rescan", summary="Deletes the DB and rescans everything")
 async def trigger_full_rescan(request: Request):
+    return await _run_on_primary("full_rescan", base_uri=str(request.base_url).rstrip('/'))
+
+async def _full_rescan(base_uri: str):
     print("--- Full database rebuild requested! ---")
+    if peer_cache.get_upstream():
+        _upstream_resync.set()
+        return {"message": f"Pull-through mode: re-mirroring the catalog from {peer_cache.get_upstream()}."}
     db_path = db_manager.DB_PATH
     if os.path.exists(db_path):
         try:
@@ -197,41 +771,121 @@ async def trigger_full_rescan(request: Request):
             server_state["db_initialized"] = False
         except OSError as e:
             raise HTTPException(status_code=500, detail=f"Error deleting database file: {e}")
-    base_path = server_state["config"]["base_path"]
-    if not os.path.isdir(base_path):
+    if not any(os.path.isdir(root.path) for root in library.get_roots(server_state["config"])):
         raise HTTPException(status_code=404, detail="Package directory not found.")
-    print(" -> Rescanning package directory...")
-    server_state["packages"] = pkg_manager.scan_directory(base_path)
+    print(" -> Rescanning library roots...")
+    server_state["root_packages"].clear()
+    hb_formatter.clear_item_cache()
     print(" -> Rebuilding database from scan results...")
-    refresh_database(str(request.base_url).rstrip('/'))
+    await _rescan_library(base_uri, full=True)
     message = f"Database rebuild complete. Found {len(server_state['packages'])} packages."
     print(f"--- {message} ---")
     return {"message": message}
 
 @app.post("/api/actions/scan")
 async def trigger_scan(scan_request: ScanRequest, request: Request):
-    base_path = scan_request.base_path
+    return await _run_on_primary("scan", base_path=scan_request.base_path, base_uri=str(request.base_url).rstrip('/'))
+
+async def _scan(base_path: str, base_uri: str):
     if not os.path.isdir(base_path):
         raise HTTPException(status_code=404, detail="Directory not found.")
     # --- MODIFIED: Update config in memory, but don't save to file here ---
     # The user should explicitly click "Save Settings" for that.
     server_state["config"]["base_path"] = base_path
-    server_state["packages"] = pkg_manager.scan_directory(base_path)
-    refresh_database(str(request.base_url).rstrip('/'))
+    await _rescan_library(base_uri)
+    _start_root_watchers()
     return {"message": f"Scan complete. Found {len(server_state['packages'])} packages."}
 
 @app.post("/api/actions/update_binaries")
-async def trigger_binary_update():
-    result = binary_updater.update_binaries()
-    return JSONResponse(content=result)
+async def trigger_binary_update(force: bool = False):
+    return JSONResponse(content=await _run_on_primary("update_binaries", force=force))
+
+async def _update_binaries(force: bool):
+    return await asyncio.to_thread(binary_updater.update_binaries, force)
+
+async def _reindex(base_uri: str):
+    await _rescan_library(base_uri, reload_index=True)
+    return len(server_state["packages"])
 
 @app.post("/api/ps4/update_cdn")
 async def update_ps4_cdn(request: UpdateCDNRequest):
+    from . import ps4_ftp_client
     try:
-        if ps4_ftp_client.update_cdn(request.ps4_ip, request.ps4_port, request.new_cdn_url):
+        # Blocking FTP session, keep it off the event loop
+        if await asyncio.to_thread(ps4_ftp_client.update_cdn, request.ps4_ip, request.ps4_port, request.new_cdn_url):
             return {"message": f"Successfully updated PS4 CDN to {request.new_cdn_url}"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/ps4/provision", summary="Sets the CDN on many consoles at once, streams one JSON line per console")
+async def provision_consoles(request: ProvisionRequest):
+    from . import ps4_ftp_client
+    try:
+        if request.targets:
+            hosts = ps4_ftp_client.expand_targets(request.targets)
+        else:
+            hosts = [console["ip"] for console in await _run_on_primary("consoles") if console["reachable"]]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    skipped = []
+    if request.skip_offline:
+        max_age = int(server_state["config"].get("health_interval") or console_inventory.HEALTH_INTERVAL) * 2
+        skipped = await _run_on_primary("offline_consoles", hosts=hosts, max_age=max_age)
+        offline = set(skipped)
+        hosts = [host for host in hosts if host not in offline]
+    print(f"--- Provisioning CDN {request.new_cdn_url} on {len(hosts)} console(s), {len(skipped)} known offline ---")
+    async def result_stream():
+        counts = {}
+        for host in skipped:
+            counts["offline"] = counts.get("offline", 0) + 1
+            yield json.dumps({"host": host, "status": "offline", "previous_cdn": None, "message": "Console is offline (cached)."}) + "\n"
+        async for result in ps4_ftp_client.provision_many(hosts, request.ps4_port, request.new_cdn_url, request.timeout, request.concurrency):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": counts, "total": len(hosts) + len(skipped)}) + "\n"
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+@app.get("/api/consoles", summary="Cached inventory of discovered consoles")
+async def get_consoles():
+    return JSONResponse(content=await _run_on_primary("consoles"))
+
+async def _consoles():
+    return console_inventory.get_inventory()
+
+async def _offline_consoles(hosts: List[str], max_age: float):
+    return [host for host in hosts if console_inventory.is_reachable(host, max_age) is False]
+
+@app.post("/api/consoles/discover", summary="Starts a console discovery on a subnet in the background")
+async def discover_consoles(request: DiscoverRequest):
+    # The console inventory lives in the primary worker
+    return await _run_on_primary("discover", subnet=request.subnet)
+
+async def _discover(subnet: Optional[str]):
+    subnet = subnet or server_state["config"].get("discovery_subnet")
+    if not subnet:
+        raise HTTPException(status_code=400, detail="No subnet given and no discovery_subnet configured.")
+    from . import ps4_ftp_client
+    try:
+        ps4_ftp_client.expand_targets([subnet])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _background_tasks.append(asyncio.create_task(console_inventory.discover([subnet], int(server_state["config"].get("ps4_port") or 2121))))
+    return {"message": f"Discovery started on {subnet}."}
+
+# Actions that must run in the primary worker, see _run_on_primary()
+PRIMARY_ACTIONS = {
+    "scan": _scan,
+    "full_rescan": _full_rescan,
+    "reindex": _reindex,
+    "update_binaries": _update_binaries,
+    "discover": _discover,
+    "consoles": _consoles,
+    "offline_consoles": _offline_consoles,
+    "record_fetches": _record_fetches,
+    "record_downloads": _record_downloads,
+    "read_ahead": _read_ahead,
+}
+
 if __name__ == "__main__":
+    # Development mode with auto-reload. For production use: python -m backend.runner
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
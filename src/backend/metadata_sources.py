@@ -0,0 +1,138 @@
+# backend/metadata_sources.py
+#
+# Store metadata (description, rating, publisher, release date) for games and apps
+# comes from a chain of providers, tried in order for every configured locale:
+#
+#   "metadata_providers": ["title_db", "scraper"],
+#   "metadata_locales": ["en-US", "de-DE"]
+#
+# "title_db" is the local offline database (see title_db.py), "scraper" searches
+# the PlayStation Store website and is only reached for titles the local database
+# doesn't know. Scraped results are saved to the title database, so the next scan
+# finds them locally.
+
+from typing import Callable, Dict, Optional
+from . import title_db
+
+DEFAULT_PROVIDERS = ["title_db", "scraper"]
+DEFAULT_LOCALES = ["en-US"]
+
+# The fields a provider can fill in
+ENRICHMENT_FIELDS = ('description', 'rating', 'publisher', 'release_date')
+
+# --- THE NEW, SIMPLER ALIAS SYSTEM ---
+# The KEY is the EXACT, RAW title from the SFO as seen in the server logs.
+# The VALUE is the precise search term you want to use instead.
+# EXAMPLES: "Raw Name" (provided by pkg): "Alias" (Name in Playstation Store)
+RAW_TITLE_ALIASES = {
+    "HITMAN 3": "HITMAN World of Assassination",
+    "Minecraft: PlayStation®4 Edition": "Minecraft",
+    "Outlast Trinity: Outlast & Outlast Whistleblower": "Outlast Trinity"
+}
+
+_settings = {"providers": list(DEFAULT_PROVIDERS), "locales": list(DEFAULT_LOCALES)}
+
+def configure(config: dict):
+    """Applies the metadata_providers / metadata_locales settings from config.json."""
+    _settings["providers"] = list(config.get("metadata_providers") or DEFAULT_PROVIDERS)
+    _settings["locales"] = list(config.get("metadata_locales") or DEFAULT_LOCALES)
+
+def _clean_title(title: str) -> str:
+    """
+    Helper function to normalize titles for comparison.
+    """
+    title = title.replace('®', '').replace('™', '').replace(':', ' ').replace('&', ' ')
+    title = title.replace('.', ' ').replace('_', ' ')
+    # Collapse all whitespace into single spaces for clean comparison
+    return ' '.join(title.lower().split())
+
+def from_title_db(metadata: dict, locale: str) -> Optional[dict]:
+    return title_db.lookup(metadata.get('TITLE_ID'), metadata.get('CONTENT_ID'), locale)
+
+def from_scraper(metadata: dict, locale: str) -> Optional[dict]:
+    # Imported on first use: the scraper pulls in requests and BeautifulSoup, which startup doesn't need
+    import difflib
+    from . import pss_scraper
+    sfo_title_id = metadata['TITLE_ID']
+    sfo_title_raw = metadata['TITLE'] # The original, uncleaned title
+
+    # --- NEW LOGIC: Check for a RAW alias FIRST ---
+    if sfo_title_raw in RAW_TITLE_ALIASES:
+        search_title = RAW_TITLE_ALIASES[sfo_title_raw]
+        print(f"    [*] Using RAW title alias: '{sfo_title_raw}' -> '{search_title}'")
+    else:
+        # If no raw alias, fall back to cleaning the title for the search
+        search_title = _clean_title(sfo_title_raw)
+
+    search_results = pss_scraper.search_playstation_store(search_title, locale)
+    if not search_results:
+        print("    [-] No results returned from PlayStation Store.")
+        return None
+
+    best_match = None; match_type = ""
+
+    # 1. Primary Method: Exact CUSA ID match
+    for game in search_results:
+        if game.get('cusa_id') == sfo_title_id:
+            best_match = game; match_type = "Exact CUSA ID"; break
+
+    # 2. Fallback Method: Fuzzy title match
+    if not best_match:
+        highest_score = 0.0
+        # The search_title is now either a clean alias or a cleaned SFO title
+        clean_search_title = _clean_title(search_title)
+
+        for game in search_results:
+            store_title_clean = _clean_title(game.get('name', ''))
+            score = difflib.SequenceMatcher(None, clean_search_title, store_title_clean).ratio()
+            if score > highest_score:
+                highest_score = score; best_match = game
+        if highest_score > 0.85:
+            match_type = f"Fuzzy Title ({int(highest_score * 100)}%)"
+        else:
+            best_match = None
+
+    # 3. Process the result
+    if not best_match:
+        print("    [-] Could not find a confident match in search results.")
+        return None
+    print(f"    [+] Match Found! (Game: '{best_match['name']}', Type: {match_type}). Fetching details...")
+    details = pss_scraper.get_game_details(best_match['link'])
+    fields = {
+        'description': details.get('description', 'Description not found.'),
+        'rating': details.get('rating', 'N/A'),
+        'publisher': details.get('publisher', 'N/A'),
+        'release_date': details.get('release_date', '2024-01-01'),
+    }
+    # Remember it locally, the next scan won't have to scrape this title again
+    title_db.save(sfo_title_id, metadata.get('CONTENT_ID'), locale, dict(fields, name=best_match['name']), source='scraper')
+    return fields
+
+PROVIDERS: Dict[str, Callable[[dict, str], Optional[dict]]] = {
+    "title_db": from_title_db,
+    "scraper": from_scraper,
+}
+
+def enrich(metadata: dict) -> Optional[str]:
+    """
+    Fills in the store fields of a game/app from the first provider and locale that
+    knows the title. Returns the provider name, or None if nobody had a match.
+    """
+    print(f"  [*] Attempting to fetch store data for '{metadata.get('TITLE')}' (Content ID: {metadata.get('CONTENT_ID', 'N/A')})...")
+    for name in _settings["providers"]:
+        provider = PROVIDERS.get(name)
+        if provider is None:
+            print(f"    [!] Unknown metadata provider '{name}', skipping."); continue
+        for locale in _settings["locales"]:
+            try:
+                fields = provider(metadata, locale)
+            except Exception as e:
+                print(f"    [!] Metadata provider '{name}' failed: {e}"); fields = None
+            # A row with only a name (e.g. a title list without store data) is not a hit
+            found = {key: fields[key] for key in ENRICHMENT_FIELDS if fields and fields.get(key)}
+            if not found: continue
+            metadata.update(found)
+            metadata['metadata_source'] = name; metadata['metadata_locale'] = locale
+            print(f"    [+] Store data from {name} ({locale}). Rating: {metadata.get('rating', 'N/A')}, Author: {metadata.get('publisher', 'N/A')}, Release: {metadata.get('release_date', 'N/A')}.")
+            return name
+    return None
@@ -0,0 +1,99 @@
+# backend/package_record.py
+#
+# Compact in-memory package record. A plain metadata dict carries every SFO key, the
+# scraped description and lots of repeated strings; with tens of thousands of PKGs
+# that adds up to hundreds of MB. A PackageRecord keeps only the fields the server
+# needs all the time in __slots__, interns repeated values (apptype, versions,
+# publisher...) and reads everything else lazily from the on-disk catalog index.
+#
+# Records behave like the old dicts (get, [], []=, in), so the rest of the code
+# does not care which one it gets.
+
+import sys
+from typing import Iterable, List
+from . import catalog_index
+
+# Fields kept in memory. Everything else (description, the remaining SFO keys...)
+# lives only in the catalog index.
+HOT_FIELDS = (
+    'file_path', 'file_size', 'file_mtime', 'library_root', 'mirrors',
+    'TITLE', 'TITLE_ID', 'CONTENT_ID', 'CATEGORY', 'VERSION', 'APP_VER',
+    'SYSTEM_VER', 'PARENTAL_LEVEL', 'apptype', 'SIZE', 'icon_url',
+    'rating', 'publisher', 'release_date',
+)
+_HOT_SET = frozenset(HOT_FIELDS)
+
+# Values that repeat across thousands of packages and are worth interning.
+_INTERNED = frozenset(('library_root', 'CATEGORY', 'VERSION', 'APP_VER', 'apptype', 'rating', 'publisher', 'release_date'))
+
+_MISSING = object()
+
+class PackageRecord:
+    __slots__ = HOT_FIELDS
+
+    def __init__(self, **fields):
+        for key in HOT_FIELDS:
+            value = fields.get(key)
+            if key in _INTERNED and isinstance(value, str): value = sys.intern(value)
+            object.__setattr__(self, key, value)
+
+    @classmethod
+    def from_metadata(cls, metadata: dict) -> 'PackageRecord':
+        """Builds a record from a full metadata dict. The dict itself should be in the catalog index."""
+        record = cls(**{key: metadata.get(key) for key in HOT_FIELDS})
+        if record.mirrors is not None: record.mirrors = tuple(record.mirrors)
+        return record
+
+    # --- dict-like access ---
+    def _extra(self) -> dict:
+        return catalog_index.load_metadata(self.file_path) if self.file_path else {}
+
+    def get(self, key, default=None):
+        if key in _HOT_SET:
+            value = getattr(self, key)
+            return default if value is None else value
+        return self._extra().get(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING: raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in _HOT_SET:
+            if key in _INTERNED and isinstance(value, str): value = sys.intern(value)
+            setattr(self, key, value); return
+        # Rare: write-through to the index so lazy reads stay consistent
+        metadata = self._extra() or self.to_dict()
+        metadata[key] = value
+        catalog_index.save_packages([metadata])
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def copy(self) -> 'PackageRecord':
+        return PackageRecord(**{key: getattr(self, key) for key in HOT_FIELDS})
+
+    def to_dict(self, extra: dict = None) -> dict:
+        """Hot fields as a plain dict, optionally merged over the given extra metadata."""
+        data = dict(extra or {})
+        for key in HOT_FIELDS:
+            value = getattr(self, key)
+            if value is not None: data[key] = list(value) if key == 'mirrors' else value
+        return data
+
+    def __repr__(self):
+        return f"PackageRecord({self.TITLE!r}, {self.file_path!r})"
+
+def to_dicts(records: Iterable, extra_keys: Iterable[str] = ('description',)) -> List[dict]:
+    """Converts records to plain dicts for JSON output, loading extra_keys in one bulk index read."""
+    records = list(records)
+    extra_keys = tuple(extra_keys)
+    extras = catalog_index.load_many((r.file_path for r in records if isinstance(r, PackageRecord)), extra_keys) if extra_keys else {}
+    result = []
+    for record in records:
+        if not isinstance(record, PackageRecord):
+            result.append(dict(record)); continue
+        metadata = extras.get(record.file_path, {})
+        result.append(record.to_dict({key: metadata[key] for key in extra_keys if key in metadata}))
+    return result
@@ -0,0 +1,322 @@
+# backend/peer_cache.py
+#
+# Pull-through mode for a small CDN node behind a slow link. With "upstream_url"
+# set in config.json the node does not scan a library of its own: it mirrors the
+# package list (and icons) of the upstream server, keeping the upstream pids, and
+# proxies /api/download/ requests upstream.
+#
+# Proxied PKG bytes are cached on local disk in BLOCK_SIZE blocks, so a second
+# console installing the same game (or resuming a download with a Range request)
+# is served locally. Only the blocks that were actually requested are stored; the
+# cache is trimmed to "peer_cache_max_gb", least recently used packages first.
+#
+#   "upstream_url": "http://192.168.1.10:8000",
+#   "peer_cache_dir": "D:/ps4cdn-cache",   # default: backend/peer_cache
+#   "peer_cache_max_gb": 200,
+#   "upstream_poll_interval": 60
+#
+# Block bookkeeping lives in a small SQLite database next to the cached files, so
+# several worker processes share one cache.
+
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'peer_cache')
+DEFAULT_MAX_GB = 100
+POLL_INTERVAL = 60
+
+# Unit of caching; a block is stored once it was received completely
+BLOCK_SIZE = 8 * 1024 * 1024
+# Read/write size while streaming
+CHUNK_SIZE = 1024 * 1024
+# Packages read within this many seconds count as in use (possibly by another worker) and are not evicted
+IN_USE_SECONDS = 600
+ICON_URL_PREFIX = "/static/icons/"
+ICON_CONCURRENCY = 8
+
+class UpstreamMismatch(Exception):
+    """The upstream pid now points to a different file; the catalog needs a resync."""
+
+_settings = {"upstream_url": "", "cache_dir": DEFAULT_CACHE_DIR, "max_bytes": DEFAULT_MAX_GB * 1024 ** 3}
+_conn = None
+_lock = threading.Lock()
+# Entry key -> number of streams of this process using it (never evicted)
+_active = {}
+# Bytes this process served from the local cache / fetched from upstream
+stats = {"cache_bytes": 0, "upstream_bytes": 0, "evicted_bytes": 0}
+
+def configure(config: dict):
+    global _conn
+    cache_dir = config.get("peer_cache_dir") or DEFAULT_CACHE_DIR
+    with _lock:
+        if _conn is not None and cache_dir != _settings["cache_dir"]:
+            _conn.close(); _conn = None
+        _settings["upstream_url"] = (config.get("upstream_url") or "").rstrip('/')
+        _settings["cache_dir"] = cache_dir
+        _settings["max_bytes"] = int(float(config.get("peer_cache_max_gb") or DEFAULT_MAX_GB) * 1024 ** 3)
+
+def get_upstream() -> str:
+    """The upstream server URL, or '' when this node serves its own library."""
+    return _settings["upstream_url"]
+
+def remote_filename(path: str) -> str:
+    """Basename of an upstream path, which may use either separator."""
+    return re.split(r'[\\/]', path or '')[-1]
+
+def _session():
+    # requests is only needed in pull-through mode
+    import requests
+    return requests.Session()
+
+# --- Catalog sync ---
+def fetch_catalog_hash(session=None) -> Optional[str]:
+    """The upstream store.db hash; changes whenever the upstream catalog is republished."""
+    session = session or _session()
+    response = session.get(f"{get_upstream()}/api.php", params={"db_check_hash": "true"}, timeout=15)
+    if response.status_code == 404: return None
+    response.raise_for_status()
+    return response.json().get("hash")
+
+def fetch_packages(icon_cache_dir: str, session=None) -> List[dict]:
+    """Downloads the upstream package list (in pid order) and any icons we don't have yet."""
+    session = session or _session()
+    response = session.get(f"{get_upstream()}/api/packages", timeout=60)
+    response.raise_for_status()
+    packages = response.json()
+    missing = sorted({
+        pkg['icon_url'] for pkg in packages
+        if (pkg.get('icon_url') or '').startswith(ICON_URL_PREFIX)
+        and not os.path.exists(os.path.join(icon_cache_dir, os.path.basename(pkg['icon_url'])))
+    })
+    def _fetch_icon(icon_url: str):
+        try:
+            icon = session.get(f"{get_upstream()}{icon_url}", timeout=30)
+            icon.raise_for_status()
+            with open(os.path.join(icon_cache_dir, os.path.basename(icon_url)), 'wb') as f: f.write(icon.content)
+        except Exception as e:
+            print(f"[!] Could not fetch icon {icon_url} from upstream: {e}")
+    if missing:
+        os.makedirs(icon_cache_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=ICON_CONCURRENCY) as pool: list(pool.map(_fetch_icon, missing))
+    print(f"[*] Fetched {len(packages)} packages and {len(missing)} icons from upstream {get_upstream()}.")
+    return packages
+
+# --- Block cache ---
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        os.makedirs(_settings["cache_dir"], exist_ok=True)
+        _conn = sqlite3.connect(os.path.join(_settings["cache_dir"], 'peer_cache.db'), check_same_thread=False, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, name TEXT, size INTEGER, cached_bytes INTEGER DEFAULT 0, last_access REAL)")
+        _conn.execute("CREATE TABLE IF NOT EXISTS blocks (key TEXT, block INTEGER, PRIMARY KEY (key, block)) WITHOUT ROWID")
+        _conn.commit()
+    return _conn
+
+def _entry_key(pkg) -> str:
+    # Same file as long as name, size and mtime match; an updated PKG gets a new entry
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', remote_filename(pkg.get('file_path')))[:120]
+    return f"{name}-{int(pkg.get('file_size') or 0):x}-{int(pkg.get('file_mtime') or 0):x}"
+
+def _data_path(key: str) -> str:
+    return os.path.join(_settings["cache_dir"], f"{key}.data")
+
+def _open_entry(key: str, name: str, size: int) -> set:
+    """Registers/touches an entry and returns the set of blocks already cached."""
+    with _lock:
+        conn = _get_conn()
+        conn.execute("INSERT OR IGNORE INTO entries (key, name, size) VALUES (?, ?, ?)", (key, name, size))
+        conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        blocks = {block for (block,) in conn.execute("SELECT block FROM blocks WHERE key = ?", (key,))}
+    if not os.path.exists(_data_path(key)):
+        # A fresh (sparse where supported) file; blocks the DB knows about are gone with it
+        with open(_data_path(key), 'wb') as f: f.truncate(size)
+        if blocks:
+            with _lock:
+                conn.execute("DELETE FROM blocks WHERE key = ?", (key,))
+                conn.execute("UPDATE entries SET cached_bytes = 0 WHERE key = ?", (key,))
+                conn.commit()
+            blocks = set()
+    return blocks
+
+def _has_block(key: str, block: int) -> bool:
+    with _lock:
+        return _get_conn().execute("SELECT 1 FROM blocks WHERE key = ? AND block = ?", (key, block)).fetchone() is not None
+
+def _touch(key: str):
+    with _lock:
+        _get_conn().execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        _get_conn().commit()
+
+def _mark_block(key: str, block: int, nbytes: int):
+    with _lock:
+        conn = _get_conn()
+        if conn.execute("INSERT OR IGNORE INTO blocks VALUES (?, ?)", (key, block)).rowcount:
+            conn.execute("UPDATE entries SET cached_bytes = cached_bytes + ?, last_access = ? WHERE key = ?", (nbytes, time.time(), key))
+        conn.commit()
+
+def evict(active_keys=()) -> int:
+    """Deletes least recently used packages until the cache fits the quota. Returns the bytes freed."""
+    freed = 0
+    with _lock:
+        conn = _get_conn()
+        total = conn.execute("SELECT COALESCE(SUM(cached_bytes), 0) FROM entries").fetchone()[0]
+        if total <= _settings["max_bytes"]: return 0
+        candidates = conn.execute(
+            "SELECT key, cached_bytes FROM entries WHERE COALESCE(last_access, 0) < ? ORDER BY last_access", (time.time() - IN_USE_SECONDS,)
+        ).fetchall()
+        for key, cached_bytes in candidates:
+            if total <= _settings["max_bytes"]: break
+            if key in active_keys: continue
+            try:
+                os.remove(_data_path(key))
+            except OSError:
+                pass
+            conn.execute("DELETE FROM blocks WHERE key = ?", (key,))
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= cached_bytes; freed += cached_bytes
+        conn.commit()
+    if freed:
+        stats["evicted_bytes"] += freed
+        print(f"[*] Peer cache: evicted {freed / 1024 ** 3:.2f} GiB of least recently used packages.")
+    return freed
+
+def get_status() -> dict:
+    with _lock:
+        conn = _get_conn()
+        entries, cached = conn.execute("SELECT COUNT(*), COALESCE(SUM(cached_bytes), 0) FROM entries").fetchone()
+    served = stats["cache_bytes"] + stats["upstream_bytes"]
+    return {
+        "upstream_url": get_upstream(), "cache_dir": _settings["cache_dir"], "packages": entries,
+        "cached_bytes": cached, "max_bytes": _settings["max_bytes"], **stats,
+        "hit_ratio": round(stats["cache_bytes"] / served, 3) if served else None,
+    }
+
+def _read(path: str, offset: int, length: int) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(length)
+
+def _write(path: str, offset: int, data: bytes):
+    with open(path, 'r+b') as f:
+        f.seek(offset)
+        f.write(data)
+
+def _acquire(key: str):
+    _active[key] = _active.get(key, 0) + 1
+
+def _release(key: str):
+    _active[key] -= 1
+    if not _active[key]: del _active[key]
+
+async def _store_chunk(key: str, data_path: str, chunk: bytes, offset: int, size: int, cached: set) -> int:
+    """Writes a chunk of a block-aligned fetch to the cache and marks the blocks it completes. Returns the new offset."""
+    await asyncio.to_thread(_write, data_path, offset, chunk)
+    stats["upstream_bytes"] += len(chunk)
+    chunk_start, offset = offset, offset + len(chunk)
+    for block in range(chunk_start // BLOCK_SIZE, offset // BLOCK_SIZE + 1):
+        block_end = min(size, (block + 1) * BLOCK_SIZE)
+        if block not in cached and offset >= block_end:
+            cached.add(block)
+            await asyncio.to_thread(_mark_block, key, block, block_end - block * BLOCK_SIZE)
+    return offset
+
+async def _finish_fetch(response, chunks, key: str, data_path: str, offset: int, fetch_end: int, size: int, cached: set):
+    """Completes the blocks of a fetch in the background after the client got its range."""
+    try:
+        while offset <= fetch_end:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if not chunk: break
+            offset = await _store_chunk(key, data_path, chunk[:fetch_end - offset + 1], offset, size, cached)
+    except Exception as e:
+        print(f"[!] Peer cache: could not finish caching {key}: {e}")
+    finally:
+        response.close()
+        _release(key)
+
+# Background block fills, referenced so they aren't garbage collected
+_fills = set()
+
+async def stream(pkg, pid: int, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Yields bytes start..end (inclusive) of an upstream package. Cached blocks are
+    read locally; each run of missing blocks is fetched with one upstream Range
+    request (widened to whole blocks), written to the cache and passed through.
+    """
+    size = int(pkg.get('file_size') or 0)
+    expected_etag = f'"{size:x}-{int(pkg.get("file_mtime") or 0):x}"'
+    key = _entry_key(pkg)
+    cached = await asyncio.to_thread(_open_entry, key, remote_filename(pkg.get('file_path')), size)
+    data_path = _data_path(key)
+    _acquire(key)
+    session, background_fill = None, False
+    try:
+        pos = start
+        while pos <= end:
+            block = pos // BLOCK_SIZE
+            if block in cached or await asyncio.to_thread(_has_block, key, block):
+                cached.add(block)
+                # Keeps long cache-served downloads from being evicted by other workers
+                await asyncio.to_thread(_touch, key)
+                block_end = min(end, (block + 1) * BLOCK_SIZE - 1)
+                while pos <= block_end:
+                    chunk = await asyncio.to_thread(_read, data_path, pos, min(CHUNK_SIZE, block_end - pos + 1))
+                    if not chunk: raise IOError(f"Cached file {data_path} is truncated.")
+                    stats["cache_bytes"] += len(chunk); pos += len(chunk)
+                    yield chunk
+                continue
+
+            # Fetch the run of missing blocks in one request
+            last = block
+            while (last + 1) * BLOCK_SIZE <= end and (last + 1) not in cached and not await asyncio.to_thread(_has_block, key, last + 1):
+                last += 1
+            fetch_start, fetch_end = block * BLOCK_SIZE, min(size, (last + 1) * BLOCK_SIZE) - 1
+            session = session or _session()
+            response = await asyncio.to_thread(
+                session.get, f"{get_upstream()}/api/download/{pid}",
+                headers={'Range': f"bytes={fetch_start}-{fetch_end}"}, stream=True, timeout=30,
+            )
+            handed_off = False
+            try:
+                response.raise_for_status()
+                if response.headers.get('ETag') != expected_etag:
+                    raise UpstreamMismatch(f"Upstream pid {pid} no longer is {remote_filename(pkg.get('file_path'))}.")
+                offset = fetch_start
+                if response.status_code != 206: offset = 0 # Upstream ignored the range, skip ahead
+                chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+                while offset <= fetch_end:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if not chunk: raise IOError("Upstream closed the connection early.")
+                    if offset < fetch_start:
+                        skip = min(len(chunk), fetch_start - offset)
+                        chunk = chunk[skip:]; offset += skip
+                        if not chunk: continue
+                    chunk = chunk[:fetch_end - offset + 1]
+                    chunk_start = offset
+                    offset = await _store_chunk(key, data_path, chunk, offset, size, cached)
+                    # Pass through the part the client asked for
+                    lo, hi = max(pos, chunk_start), min(end, offset - 1)
+                    if lo <= hi:
+                        pos = hi + 1
+                        if pos > end and offset <= fetch_end:
+                            # The rest of the block is only for the cache; don't make the client wait for it
+                            _acquire(key); handed_off = background_fill = True
+                            task = asyncio.create_task(_finish_fetch(response, chunks, key, data_path, offset, fetch_end, size, cached))
+                            _fills.add(task); task.add_done_callback(_fills.discard)
+                        yield chunk[lo - chunk_start:hi - chunk_start + 1]
+                        if handed_off: break
+            finally:
+                if not handed_off: response.close()
+            pos = max(pos, min(end, fetch_end) + 1)
+    finally:
+        _release(key)
+        # A background fill still reads through the session's connection
+        if session is not None and not background_fill: session.close()
+        await asyncio.to_thread(evict, set(_active))
@@ -1,18 +1,26 @@
 # backend/ps4_ftp_client.py (Final version with correct INI parsing)
 
 import ftplib
+import asyncio
+import ipaddress
 import configparser # <-- The correct library for .ini files
 from io import StringIO, BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, List
 
 # --- The correct path you found ---
 HBS_SETTINGS_PATH = "/user/app/NPXS39041/settings.ini"
 
-def _connect_to_ps4(host: str, port: int):
+DEFAULT_TIMEOUT = 10
+# Upper bound for subnet expansion in batch provisioning (a /22)
+MAX_BATCH_HOSTS = 1024
+
+def _connect_to_ps4(host: str, port: int, timeout: float = DEFAULT_TIMEOUT):
     """Establishes an FTP connection to the PS4."""
     try:
         ftp = ftplib.FTP()
         print(f"Connecting to PS4 FTP at {host}:{port}...")
-        ftp.connect(host, port, timeout=10)
+        ftp.connect(host, port, timeout=timeout)
         ftp.login()
         print("FTP connection successful.")
         return ftp
@@ -42,6 +50,90 @@ def _get_settings_config(ftp: ftplib.FTP) -> configparser.ConfigParser:
         else:
             raise
             
+def provision_console(host: str, port: int, new_cdn_url: str, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Points one console's HB-Store at new_cdn_url over a single FTP session.
+    The upload is skipped if settings.ini already has the right CDN.
+    Returns a result dict instead of raising, for batch use.
+    """
+    result = {"host": host, "status": "error", "previous_cdn": None, "message": ""}
+    try:
+        ftp = _connect_to_ps4(host, port, timeout)
+    except ConnectionError as e:
+        result["status"] = "offline"; result["message"] = str(e); return result
+    try:
+        config = _get_settings_config(ftp)
+        current = config['Settings'].get('CDN') if config.has_section('Settings') else None
+        result["previous_cdn"] = current
+        if current == new_cdn_url:
+            result["status"] = "unchanged"; result["message"] = "CDN already set."
+            print(f"CDN on {host} is already '{new_cdn_url}', skipping upload.")
+            return result
+        _upload_settings(ftp, config, new_cdn_url)
+        result["status"] = "updated"; result["message"] = f"CDN changed to {new_cdn_url}."
+    except Exception as e:
+        result["message"] = str(e)
+    finally:
+        try:
+            ftp.quit()
+        except Exception:
+            ftp.close()
+    return result
+
+def expand_targets(targets: List[str]) -> List[str]:
+    """Turns a list of IPs, hostnames and CIDR subnets (e.g. '192.168.1.0/24') into hosts."""
+    hosts = []
+    for target in targets:
+        target = target.strip()
+        if not target: continue
+        if '/' in target:
+            network = ipaddress.ip_network(target, strict=False)
+            if network.num_addresses > MAX_BATCH_HOSTS + 2:
+                raise ValueError(f"Subnet {target} is too large (max. {MAX_BATCH_HOSTS} hosts).")
+            hosts.extend(str(ip) for ip in network.hosts())
+        else:
+            hosts.append(target)
+    unique = list(dict.fromkeys(hosts))
+    if len(unique) > MAX_BATCH_HOSTS:
+        raise ValueError(f"Too many targets (max. {MAX_BATCH_HOSTS}).")
+    return unique
+
+async def provision_many(hosts: List[str], port: int, new_cdn_url: str, timeout: float = DEFAULT_TIMEOUT, concurrency: int = 16) -> AsyncIterator[dict]:
+    """
+    Provisions many consoles concurrently. The blocking FTP sessions run in a pool
+    of their own (not the default executor that downloads use), so the event loop
+    and running downloads stay responsive. Every socket operation honours `timeout`.
+    Results are yielded as they finish.
+    """
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="provision")
+    try:
+        futures = [loop.run_in_executor(pool, provision_console, host, port, new_cdn_url, timeout) for host in hosts]
+        for finished in asyncio.as_completed(futures):
+            yield await finished
+    finally:
+        # Consoles not started yet are dropped if the client went away; running sessions finish on their own
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def _upload_settings(ftp: ftplib.FTP, config: configparser.ConfigParser, new_cdn_url: str):
+    """Writes the new CDN into the parsed settings and uploads them back."""
+    # 2. Modify the CDN URL under the [Settings] section
+    print(f"Changing CDN from '{config['Settings']['CDN']}' to '{new_cdn_url}'")
+    config['Settings']['CDN'] = new_cdn_url
+    
+    # 3. Prepare the new file for upload
+    # We write the changes to an in-memory string buffer
+    string_buffer = StringIO()
+    config.write(string_buffer)
+    
+    # Get the string content and encode it back to bytes for FTP
+    upload_bytes = string_buffer.getvalue().encode('utf-8')
+    upload_buffer = BytesIO(upload_bytes)
+    
+    # 4. Upload the modified file back to the PS4
+    print(f"Uploading modified settings back to {HBS_SETTINGS_PATH}...")
+    ftp.storbinary(f"STOR {HBS_SETTINGS_PATH}", upload_buffer)
+
 def update_cdn(host: str, port: int, new_cdn_url: str) -> bool:
     """
     Connects to the PS4, downloads settings.ini, updates the CDN URL,
@@ -53,22 +145,10 @@ def update_cdn(host: str, port: int, new_cdn_url: str) -> bool:
         # 1. Download and parse the INI file
         config = _get_settings_config(ftp)
         
-        # 2. Modify the CDN URL under the [Settings] section
-        print(f"Changing CDN from '{config['Settings']['CDN']}' to '{new_cdn_url}'")
-        config['Settings']['CDN'] = new_cdn_url
-        
-        # 3. Prepare the new file for upload
-        # We write the changes to an in-memory string buffer
-        string_buffer = StringIO()
-        config.write(string_buffer)
-        
-        # Get the string content and encode it back to bytes for FTP
-        upload_bytes = string_buffer.getvalue().encode('utf-8')
-        upload_buffer = BytesIO(upload_bytes)
-        
-        # 4. Upload the modified file back to the PS4
-        print(f"Uploading modified settings back to {HBS_SETTINGS_PATH}...")
-        ftp.storbinary(f"STOR {HBS_SETTINGS_PATH}", upload_buffer)
+        if config['Settings'].get('CDN') == new_cdn_url:
+            print(f"CDN is already '{new_cdn_url}', skipping upload.")
+            return True
+        _upload_settings(ftp, config, new_cdn_url)
         
         print("CDN update successful!")
         return True
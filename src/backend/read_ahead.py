@@ -0,0 +1,222 @@
+# backend/read_ahead.py
+#
+# Read-ahead and page-cache warming for PKG downloads. The first console to install
+# a big game otherwise reads it cold from the NAS in small reads.
+#
+# - stream_file() reads with posix_fadvise(SEQUENTIAL) plus a rolling WILLNEED hint
+#   ahead of the read position, and adapts its read size: it grows while reading
+#   is the bottleneck and shrinks again when the client is the slow side.
+# - Every download start bumps a decaying popularity score. Packages with the same
+#   TITLE_ID (patches/DLC of a game being installed) are marked as likely next.
+# - While no download is running, run_warmer() pre-loads the most popular and the
+#   likely-next packages into the page cache: posix_fadvise(WILLNEED) where
+#   available, large sequential reads otherwise.
+#
+#   "warm_cache": true, "warm_max_gb": 4, "warm_top_n": 20
+#
+# With several workers only the primary keeps the popularity and warms; the others
+# hand it their download starts and report their running streams (shared_stats()).
+#
+# Reads that complete faster than WARM_READ_BYTES_PER_SEC are counted as served
+# from warm cache; get_stats() reports that share of the bandwidth.
+
+import os
+import json
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Iterable, List, Optional
+
+POPULARITY_PATH = os.path.join(os.path.dirname(__file__), 'popularity.json')
+
+MIN_CHUNK = 1024 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+# How far ahead of the read position the kernel is asked to read
+READAHEAD_WINDOW = 64 * 1024 * 1024
+# A read faster than this didn't hit the disk/network (page cache)
+WARM_READ_BYTES_PER_SEC = 512 * 1024 ** 2
+# Popularity halves every day
+HALF_LIFE_SECONDS = 24 * 3600
+# Bonus for packages sharing a TITLE_ID with one that is being downloaded
+RELATED_BOOST = 0.5
+# Files are not warmed again within this many seconds (the page cache keeps them a while)
+WARM_TTL = 1800
+WARM_INTERVAL = 60
+WARM_READ_SIZE = 4 * 1024 * 1024
+
+_FADVISE = hasattr(os, 'posix_fadvise')
+
+_lock = threading.Lock()
+# file_path -> {"score", "updated", "last_download", "downloads"}
+_popularity = {}
+_dirty = False
+_warmed_at = {}
+_active_streams = 0
+stats = {"served_bytes": 0, "warm_bytes": 0, "warmed_files": 0, "warmed_bytes": 0, "warm_runs": 0}
+
+def _advise(fd: int, offset: int, length: int, advice_name: str):
+    if not _FADVISE: return
+    try:
+        os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+    except OSError:
+        pass # Not supported by this file system
+
+# --- Popularity ---
+def load_popularity():
+    global _popularity
+    try:
+        with open(POPULARITY_PATH, 'r') as f:
+            _popularity = json.load(f)
+    except (OSError, ValueError):
+        _popularity = {}
+
+def save_popularity():
+    global _dirty
+    with _lock:
+        if not _dirty: return
+        data = json.dumps(_popularity); _dirty = False
+    tmp_path = f"{POPULARITY_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, POPULARITY_PATH)
+
+def _decayed(entry: dict, now: float) -> float:
+    return entry["score"] * 0.5 ** ((now - entry["updated"]) / HALF_LIFE_SECONDS)
+
+def _bump(file_path: str, amount: float, now: float, download: bool):
+    entry = _popularity.get(file_path) or {"score": 0.0, "updated": now, "last_download": None, "downloads": 0}
+    entry["score"] = _decayed(entry, now) + amount; entry["updated"] = now
+    if download:
+        entry["last_download"] = now; entry["downloads"] += 1
+    _popularity[file_path] = entry
+
+def record_download(pkg, packages: Iterable, when: float = None):
+    """Called when a download starts. Related packages (same TITLE_ID) get a smaller boost."""
+    global _dirty
+    file_path = pkg.get('file_path')
+    if not file_path: return
+    now = when or time.time()
+    title_id = pkg.get('TITLE_ID')
+    related = [other.get('file_path') for other in packages if title_id and other is not pkg and other.get('TITLE_ID') == title_id] if title_id else []
+    with _lock:
+        _bump(file_path, 1.0, now, download=True)
+        for path in related:
+            if path: _bump(path, RELATED_BOOST, now, download=False)
+        _dirty = True
+
+def get_popular(limit: int) -> List[tuple]:
+    """[(file_path, score)] by decayed popularity, highest first."""
+    now = time.time()
+    with _lock:
+        ranked = sorted(((path, _decayed(entry, now)) for path, entry in _popularity.items()), key=lambda item: item[1], reverse=True)
+    return ranked[:limit]
+
+# --- Streaming ---
+async def stream_file(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """Yields bytes start..end (inclusive) of a local file with read-ahead hints and adaptive read sizes."""
+    global _active_streams
+    f = await asyncio.to_thread(open, path, 'rb')
+    _active_streams += 1
+    try:
+        _advise(f.fileno(), start, 0, 'POSIX_FADV_SEQUENTIAL')
+        await asyncio.to_thread(f.seek, start)
+        pos, chunk_size, advised_to = start, MIN_CHUNK, start
+        while pos <= end:
+            if pos + READAHEAD_WINDOW // 2 > advised_to:
+                _advise(f.fileno(), pos, READAHEAD_WINDOW, 'POSIX_FADV_WILLNEED'); advised_to = pos + READAHEAD_WINDOW
+            read_started = time.perf_counter()
+            chunk = await asyncio.to_thread(f.read, min(chunk_size, end - pos + 1))
+            read_time = time.perf_counter() - read_started
+            if not chunk: break
+            pos += len(chunk)
+            stats["served_bytes"] += len(chunk)
+            if len(chunk) / max(read_time, 1e-9) >= WARM_READ_BYTES_PER_SEC: stats["warm_bytes"] += len(chunk)
+            sent_started = time.perf_counter()
+            yield chunk
+            send_time = time.perf_counter() - sent_started
+            # Bigger reads while the disk is the bottleneck, smaller ones when the client is
+            if read_time >= send_time: chunk_size = min(MAX_CHUNK, chunk_size * 2)
+            elif send_time > 4 * read_time: chunk_size = max(MIN_CHUNK, chunk_size // 2)
+    finally:
+        _active_streams -= 1
+        await asyncio.to_thread(f.close)
+
+# --- Warming ---
+def _available_memory() -> Optional[int]:
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'): return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def warm_file(path: str, max_bytes: int, should_stop: Callable[[], bool] = lambda: False) -> int:
+    """Pulls up to max_bytes of a file into the page cache. Returns the number of bytes requested/read."""
+    try:
+        size = min(os.path.getsize(path), max_bytes)
+        with open(path, 'rb') as f:
+            if _FADVISE:
+                os.posix_fadvise(f.fileno(), 0, size, os.POSIX_FADV_WILLNEED)
+                return size
+            done = 0
+            while done < size and not should_stop():
+                chunk = f.read(min(WARM_READ_SIZE, size - done))
+                if not chunk: break
+                done += len(chunk)
+            return done
+    except OSError as e:
+        print(f"[!] Could not warm {os.path.basename(path)}: {e}")
+        return 0
+
+def warm_popular(resolve_path: Callable[[str], Optional[str]], top_n: int, budget: int, busy: Callable[[], bool] = lambda: _active_streams > 0) -> int:
+    """Warms the most popular packages that weren't warmed recently, within the byte budget, until busy()."""
+    now, warmed = time.time(), 0
+    for file_path, score in get_popular(top_n):
+        if warmed >= budget or busy(): break
+        if now - _warmed_at.get(file_path, 0) < WARM_TTL: continue
+        path = resolve_path(file_path)
+        if not path: continue
+        done = warm_file(path, budget - warmed, should_stop=busy)
+        if done:
+            _warmed_at[file_path] = now; warmed += done
+            stats["warmed_files"] += 1; stats["warmed_bytes"] += done
+    return warmed
+
+async def run_warmer(get_config: Callable[[], dict], resolve_path: Callable[[str], Optional[str]], other_streams: Callable[[], int] = lambda: 0):
+    """Background loop: warms popular packages whenever no download is streaming (here or in other_streams()). One per server."""
+    load_popularity()
+    busy = lambda: _active_streams > 0 or other_streams() > 0
+    while True:
+        await asyncio.sleep(WARM_INTERVAL)
+        try:
+            config = get_config()
+            await asyncio.to_thread(save_popularity)
+            if not config.get("warm_cache", True) or await asyncio.to_thread(busy): continue
+            budget = int(float(config.get("warm_max_gb") or 4) * 1024 ** 3)
+            available = _available_memory()
+            if available is not None: budget = min(budget, available // 2)
+            warmed = await asyncio.to_thread(warm_popular, resolve_path, int(config.get("warm_top_n") or 20), budget, busy)
+            if warmed:
+                stats["warm_runs"] += 1
+                print(f"[*] Warmed {warmed / 1024 ** 2:.0f} MiB of popular packages into the page cache.")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[!] Cache warming failed: {e}")
+
+def shared_stats() -> dict:
+    """What a worker reports to the others: its running streams and served bytes."""
+    return {"active_streams": _active_streams, "served_bytes": stats["served_bytes"], "warm_bytes": stats["warm_bytes"]}
+
+def get_stats(limit: int = 10, others: Iterable[dict] = ()) -> dict:
+    """Our stats, with the streams and served bytes of other workers (their shared_stats()) added."""
+    totals = shared_stats()
+    for other in others:
+        for key in totals: totals[key] += other.get(key, 0)
+    served = totals["served_bytes"]
+    return {
+        **stats, **totals, "warm_ratio": round(totals["warm_bytes"] / served, 3) if served else None,
+        "fadvise": _FADVISE,
+        "popular": [{"file_path": path, "score": round(score, 3), "downloads": _popularity[path]["downloads"]} for path, score in get_popular(limit)],
+    }
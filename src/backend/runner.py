@@ -0,0 +1,75 @@
+# backend/runner.py
+#
+# Production runner. Unlike start_server.sh's old `uvicorn --reload` dev mode, this
+# runs without a file watcher, with tuned keep-alive/backlog settings and optionally
+# several worker processes. Workers share the catalog through the on-disk index and
+# its version file; only the primary worker scans (see worker_role.py).
+#
+# Run from the 'src' folder:
+#   python -m backend.runner --workers 4
+#   python -m backend.runner --http2 --certfile cert.pem --keyfile key.pem   (needs hypercorn)
+
+import os
+import argparse
+import importlib.util
+from . import worker_role
+
+APP = "backend.main:app"
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PS4 CDN Server production runner")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (default: 1)")
+    parser.add_argument("--keep-alive", type=int, default=75, help="Seconds to keep idle connections open (default: 75)")
+    parser.add_argument("--backlog", type=int, default=2048, help="Max. number of pending connections (default: 2048)")
+    parser.add_argument("--limit-concurrency", type=int, default=None, help="Max. concurrent connections per worker before answering 503")
+    parser.add_argument("--http2", action="store_true", help="Serve HTTP/2 with hypercorn (h2c, or h2 with --certfile/--keyfile)")
+    parser.add_argument("--certfile", default=None)
+    parser.add_argument("--keyfile", default=None)
+    return parser.parse_args(argv)
+
+def _run_uvicorn(args):
+    import uvicorn
+    # uvloop/httptools are optional speedups, used when installed
+    loop = "uvloop" if _has_module("uvloop") else "asyncio"
+    http = "httptools" if _has_module("httptools") else "h11"
+    print(f"[*] Starting uvicorn: {args.workers} worker(s), loop={loop}, http={http}, keep-alive={args.keep_alive}s, backlog={args.backlog}")
+    uvicorn.run(
+        APP, host=args.host, port=args.port, workers=args.workers, reload=False,
+        loop=loop, http=http, timeout_keep_alive=args.keep_alive, backlog=args.backlog,
+        limit_concurrency=args.limit_concurrency, ssl_certfile=args.certfile, ssl_keyfile=args.keyfile,
+        access_log=False, server_header=False,
+    )
+
+def _run_hypercorn(args):
+    from hypercorn.config import Config
+    from hypercorn.run import run
+    config = Config()
+    config.application_path = APP
+    config.bind = [f"{args.host}:{args.port}"]
+    config.workers = args.workers
+    config.keep_alive_timeout = args.keep_alive
+    config.backlog = args.backlog
+    config.certfile = args.certfile
+    config.keyfile = args.keyfile
+    if _has_module("uvloop"): config.worker_class = "uvloop"
+    print(f"[*] Starting hypercorn (HTTP/2): {args.workers} worker(s), keep-alive={args.keep_alive}s, backlog={args.backlog}")
+    run(config)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Tells every worker process whether it has to coordinate with others
+    os.environ[worker_role.WORKERS_ENV] = str(max(1, args.workers))
+    if args.http2:
+        if not _has_module("hypercorn"):
+            raise SystemExit("HTTP/2 needs hypercorn: pip install hypercorn")
+        _run_hypercorn(args)
+    else:
+        _run_uvicorn(args)
+
+if __name__ == "__main__":
+    main()
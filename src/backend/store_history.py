@@ -0,0 +1,108 @@
+# backend/store_history.py
+#
+# Keeps the last few published store.db versions (keyed by the MD5 that /api.php
+# reports) and computes compact row-level deltas between them. Stock HB-Store
+# clients keep downloading the full store.db; the delta endpoint is for our own
+# sync tools and the web UI.
+#
+# Delta format (JSON):
+#   {"from": <md5>, "to": <md5>, "columns": [...],
+#    "upsert": [[row values in column order], ...], "delete": [pid, ...]}
+#
+# Rows are matched by pid, which is the package's position in the sorted catalog.
+# Deltas are compact for packages appended at the end and for changes that keep the
+# order (updated metadata of a few packages). A package inserted or removed in
+# the middle shifts the pid of every later package, and all of those rows end up
+# in the delta, up to about the size of the gzip-compressed full store.db.
+
+import os
+import json
+import gzip
+import shutil
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+HISTORY_DIR = os.path.join(os.path.dirname(__file__), 'store_history')
+INDEX_PATH = os.path.join(HISTORY_DIR, 'index.json')
+MAX_VERSIONS = 10
+# Number of computed (gzip-compressed) deltas kept in memory
+MAX_CACHED_DELTAS = 32
+
+_lock = threading.Lock()
+_delta_cache = OrderedDict()
+
+def _load_index() -> List[str]:
+    try:
+        with open(INDEX_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def _save_index(versions: List[str]):
+    tmp_path = INDEX_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, INDEX_PATH)
+
+def _version_path(md5: str) -> str:
+    return os.path.join(HISTORY_DIR, f"{md5}.db")
+
+def record(db_path: str, md5: str):
+    """Adds a freshly published store.db to the history and prunes the oldest versions."""
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    with _lock:
+        versions = _load_index()
+        if versions and versions[-1] == md5: return
+        if not os.path.exists(_version_path(md5)):
+            shutil.copyfile(db_path, _version_path(md5))
+        versions = [v for v in versions if v != md5] + [md5]
+        for old in versions[:-MAX_VERSIONS]:
+            try:
+                os.remove(_version_path(old))
+            except OSError:
+                pass
+        versions = versions[-MAX_VERSIONS:]
+        _save_index(versions)
+
+def get_versions() -> List[str]:
+    """Known store.db hashes, oldest first. The last one is the current version."""
+    return _load_index()
+
+def _read_rows(md5: str):
+    con = sqlite3.connect(f"file:{_version_path(md5)}?mode=ro", uri=True)
+    try:
+        cur = con.execute("SELECT * FROM homebrews")
+        columns = [d[0] for d in cur.description]
+        return columns, {row[0]: row for row in cur.fetchall()}
+    finally:
+        con.close()
+
+def compute_delta(from_md5: str, to_md5: str) -> dict:
+    """Row-level difference between two recorded versions, keyed by pid."""
+    columns, old_rows = _read_rows(from_md5)
+    new_columns, new_rows = _read_rows(to_md5)
+    if new_columns != columns:
+        raise ValueError("store.db layout changed between versions.")
+    upsert = [list(row) for pid, row in new_rows.items() if old_rows.get(pid) != row]
+    delete = [pid for pid in old_rows if pid not in new_rows]
+    return {"from": from_md5, "to": to_md5, "columns": columns, "upsert": upsert, "delete": delete}
+
+def get_delta_gzip(from_md5: str) -> Optional[bytes]:
+    """
+    Gzip-compressed JSON delta from a known version to the current one, or
+    None if from_md5 is not in the history (the client should fetch the full DB).
+    """
+    versions = get_versions()
+    if not versions or from_md5 not in versions: return None
+    to_md5 = versions[-1]
+    key = (from_md5, to_md5)
+    with _lock:
+        if key in _delta_cache:
+            _delta_cache.move_to_end(key); return _delta_cache[key]
+    data = gzip.compress(json.dumps(compute_delta(from_md5, to_md5), separators=(',', ':')).encode('utf-8'), mtime=0)
+    with _lock:
+        _delta_cache[key] = data
+        while len(_delta_cache) > MAX_CACHED_DELTAS: _delta_cache.popitem(last=False)
+    return data
@@ -0,0 +1,124 @@
+# backend/store_views.py
+#
+# Per-console store.db views. A profile in config.json filters the catalog for the
+# consoles it applies to (kids' consoles, low firmware consoles...):
+#
+#   "store_profiles": [
+#       {"name": "kids", "clients": ["192.168.1.20"], "token": "kids123",
+#        "apptypes": ["HB Game", "App"], "max_parental_level": 5,
+#        "max_sys_ver": "9.00", "regions": ["EU", "US"]}
+#   ]
+#
+# Consoles are matched by IP, or by token when their HB-Store CDN is set to
+# http://<server>:8000/p/<token>. Each view's store.db and MD5 are built on the
+# first request and cached until the catalog (or the profile) changes, so polling
+# consoles never trigger a rebuild of their own.
+
+import os
+import json
+import asyncio
+import hashlib
+from typing import List, Optional, Tuple
+from . import db_manager, hb_formatter, hot_cache
+
+VIEWS_DIR = os.path.join(os.path.dirname(__file__), 'views')
+
+# The first character of a CONTENT_ID identifies the store region.
+REGION_PREFIXES = {'U': 'US', 'E': 'EU', 'J': 'JP', 'H': 'Asia', 'I': 'Internal'}
+
+# profile name -> {"key": ..., "path": ..., "hash": ...}
+_views = {}
+_locks = {}
+
+def get_region(content_id: str) -> str:
+    return REGION_PREFIXES.get((content_id or ' ')[0].upper(), 'UNKNOWN')
+
+def _parse_sys_ver(value) -> Optional[int]:
+    """Package SYSTEM_VER 0x09008000 -> 0x0900. None if not parseable."""
+    try:
+        return int(value) >> 16
+    except (TypeError, ValueError):
+        return None
+
+def _parse_max_sys_ver(value) -> Optional[int]:
+    """Profile firmware limit: '9.00' -> 0x0900, a bare major version '9' or 11 -> 0x0900 / 0x1100."""
+    if value is None: return None
+    major, _, minor = str(value).strip().partition('.')
+    try:
+        return (int(major, 16) << 8) | int(minor[:2].ljust(2, '0'), 16)
+    except ValueError:
+        return None
+
+def find_profile(config: dict, client_ip: Optional[str], token: Optional[str] = None) -> Optional[dict]:
+    """Returns the profile matching the token (if given) or the client IP."""
+    for profile in config.get("store_profiles") or []:
+        if token is not None:
+            if profile.get("token") and profile["token"] == token: return profile
+        elif client_ip and client_ip in (profile.get("clients") or []):
+            return profile
+    return None
+
+def matches(profile: dict, pkg) -> bool:
+    apptypes = profile.get("apptypes")
+    if apptypes and pkg.get("apptype", "Unknown") not in apptypes: return False
+    max_level = profile.get("max_parental_level")
+    if max_level is not None:
+        try:
+            if int(pkg.get("PARENTAL_LEVEL", 0)) > int(max_level): return False
+        except (TypeError, ValueError):
+            pass
+    max_sys_ver = _parse_max_sys_ver(profile.get("max_sys_ver"))
+    if max_sys_ver is not None:
+        pkg_sys_ver = _parse_sys_ver(pkg.get("SYSTEM_VER"))
+        if pkg_sys_ver is not None and pkg_sys_ver > max_sys_ver: return False
+    regions = profile.get("regions")
+    if regions and get_region(pkg.get("CONTENT_ID")) not in regions: return False
+    return True
+
+def _build_view(profile: dict, packages: List, base_uri: str, db_path: str) -> Optional[str]:
+    # pids stay the catalog-wide indexes so /api/download/{pid} works for every view
+    items = (
+        hb_formatter.create_hb_store_item(pkg, base_uri, pid=i + 1)
+        for i, pkg in enumerate(packages) if matches(profile, pkg)
+    )
+    if not db_manager.create_db_from_packages(items, db_path=db_path): return None
+    hot_cache.invalidate(db_path)
+    entry = hot_cache.get(db_path)
+    if entry is not None: return entry.md5
+    with open(db_path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+async def get_view(profile: dict, packages: List, catalog_version: int, base_uri: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Returns (db_path, md5) of the profile's store.db, building it only if the
+    catalog version, base URI or profile changed since the cached build.
+    """
+    name = profile.get("name") or profile.get("token") or "profile"
+    key = (catalog_version, base_uri, json.dumps(profile, sort_keys=True))
+    lock = _locks.setdefault(name, asyncio.Lock())
+    async with lock:
+        cached = _views.get(name)
+        if cached and cached["key"] == key and os.path.exists(cached["path"]):
+            return cached["path"], cached["hash"]
+        os.makedirs(VIEWS_DIR, exist_ok=True)
+        safe_name = "".join(c for c in name if c.isalnum() or c in "-_") or "profile"
+        db_path = os.path.join(VIEWS_DIR, f"{safe_name}.db")
+        print(f"--- Building store view '{name}' ---")
+        file_hash = await asyncio.to_thread(_build_view, profile, list(packages), base_uri, db_path)
+        if file_hash is None: return None, None
+        _views[name] = {"key": key, "path": db_path, "hash": file_hash}
+        return db_path, file_hash
+
+def get_status(config: dict, catalog_version: int) -> list:
+    """Profiles with the state of their cached view, for the API."""
+    status = []
+    for profile in config.get("store_profiles") or []:
+        name = profile.get("name") or profile.get("token") or "profile"
+        cached = _views.get(name)
+        status.append({
+            "name": name, "clients": profile.get("clients") or [],
+            "has_token": bool(profile.get("token")),
+            "cached": bool(cached and cached["key"][0] == catalog_version),
+            "hash": cached["hash"] if cached else None,
+        })
+    return status
@@ -0,0 +1,185 @@
+# backend/title_db.py
+#
+# Local, offline title database. Holds store metadata (description, publisher,
+# rating, release date) per TITLE_ID/CONTENT_ID and locale, so most packages are
+# enriched with an indexed lookup instead of scraping the PlayStation Store.
+#
+# Filled from bulk dumps, either through the web UI or from the 'src' folder:
+#   python -m backend.title_db import titles.json --locale en-US
+#   python -m backend.title_db stats
+#
+# JSON dumps are a list of objects or an object keyed by TITLE_ID/CONTENT_ID; CSV
+# dumps need a header row. Column names are matched loosely (TITLE_ID, titleId,
+# title_id...), see COLUMN_ALIASES. Rows without a locale get the one given on import.
+
+import os
+import re
+import csv
+import json
+import sqlite3
+import argparse
+import threading
+from typing import Iterable, Iterator, List, Optional
+
+TITLE_DB_PATH = os.path.join(os.path.dirname(__file__), 'title_db.db')
+
+# Metadata columns, in table order
+FIELDS = ('name', 'description', 'publisher', 'rating', 'release_date')
+
+# Normalized dump column name (lowercase, letters and digits only) -> our column
+COLUMN_ALIASES = {
+    'titleid': 'title_id', 'cusa': 'title_id', 'cusaid': 'title_id',
+    'contentid': 'content_id', 'productid': 'content_id',
+    'locale': 'locale', 'lang': 'locale', 'language': 'locale',
+    'name': 'name', 'title': 'name', 'titlename': 'name', 'gamename': 'name',
+    'description': 'description', 'desc': 'description', 'longdescription': 'description',
+    'publisher': 'publisher', 'author': 'publisher', 'developer': 'publisher',
+    'rating': 'rating', 'starrating': 'rating', 'averagerating': 'rating',
+    'releasedate': 'release_date', 'released': 'release_date', 'release': 'release_date',
+}
+
+# Rows are written in batches of this size while importing
+IMPORT_BATCH_SIZE = 5000
+
+_conn = None
+_lock = threading.Lock()
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(TITLE_DB_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS titles (
+                title_id TEXT NOT NULL,
+                content_id TEXT NOT NULL DEFAULT '',
+                locale TEXT NOT NULL,
+                name TEXT, description TEXT, publisher TEXT, rating TEXT, release_date TEXT,
+                source TEXT,
+                PRIMARY KEY (title_id, locale, content_id)
+            )""")
+        _conn.execute("CREATE INDEX IF NOT EXISTS titles_content ON titles (content_id, locale)")
+        _conn.commit()
+    return _conn
+
+def _normalize_locale(locale: Optional[str]) -> str:
+    return (locale or '').strip().lower().replace('_', '-')
+
+def _title_id_from_content_id(content_id: str) -> str:
+    # UP0000-CUSA00001_00-... -> CUSA00001
+    return content_id[7:16] if len(content_id) >= 16 else ''
+
+def _to_row(entry: dict, default_locale: str, source: str) -> Optional[tuple]:
+    values = {}
+    for key, value in entry.items():
+        column = COLUMN_ALIASES.get(re.sub(r'[^a-z0-9]', '', str(key).lower()))
+        if column and column not in values and value not in (None, ''):
+            values[column] = str(value).strip()
+    content_id = values.get('content_id', '').upper()
+    title_id = (values.get('title_id') or _title_id_from_content_id(content_id)).upper()
+    if not title_id: return None
+    locale = _normalize_locale(values.get('locale') or default_locale)
+    return (title_id, content_id, locale) + tuple(values.get(field) for field in FIELDS) + (source,)
+
+def _read_entries(path: str) -> Iterator[dict]:
+    if path.lower().endswith('.csv'):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        yield from (entry for entry in data if isinstance(entry, dict))
+        return
+    if not isinstance(data, dict):
+        raise ValueError("JSON dump must be a list of titles or an object keyed by TITLE_ID/CONTENT_ID.")
+    for key, value in data.items():
+        # A key can hold one entry or a list of per-locale entries
+        for entry in (value if isinstance(value, list) else [value]):
+            if not isinstance(entry, dict): continue
+            id_column = 'CONTENT_ID' if '-' in key else 'TITLE_ID'
+            yield {id_column: key, **entry}
+
+def _write_rows(rows: List[tuple]):
+    with _lock:
+        conn = _get_conn()
+        conn.executemany("INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+def import_file(path: str, locale: str = 'en-US', source: str = 'import') -> int:
+    """Imports a JSON or CSV dump. Existing rows for the same id and locale are replaced. Returns the row count."""
+    count, batch = 0, []
+    try:
+        for entry in _read_entries(path):
+            row = _to_row(entry, locale, source)
+            if row is None: continue
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _write_rows(batch); count += len(batch); batch = []
+    except csv.Error as e:
+        raise ValueError(f"Invalid CSV: {e}")
+    if batch:
+        _write_rows(batch); count += len(batch)
+    print(f"[*] Imported {count} titles from {os.path.basename(path)} into the title database.")
+    return count
+
+def save(title_id: str, content_id: str, locale: str, fields: dict, source: str):
+    """Stores one title, e.g. a scraped result, so the next lookup is a local hit."""
+    row = _to_row({'TITLE_ID': title_id, 'CONTENT_ID': content_id or '', **fields}, locale, source)
+    if row is not None: _write_rows([row])
+
+def lookup(title_id: Optional[str], content_id: Optional[str], locale: str) -> Optional[dict]:
+    """
+    Returns the metadata fields for a title in one locale, or None. A row for the
+    exact CONTENT_ID wins over a TITLE_ID-only row, which wins over other regions' rows.
+    """
+    content_id = (content_id or '').upper()
+    title_id = (title_id or _title_id_from_content_id(content_id)).upper()
+    if not title_id: return None
+    with _lock:
+        row = _get_conn().execute(
+            f"SELECT {', '.join(FIELDS)} FROM titles WHERE locale = ? AND (title_id = ? OR (? != '' AND content_id = ?))"
+            " ORDER BY content_id = ? DESC, content_id = '' DESC LIMIT 1",
+            (_normalize_locale(locale), title_id, content_id, content_id, content_id),
+        ).fetchone()
+    if row is None: return None
+    return {field: value for field, value in zip(FIELDS, row) if value is not None}
+
+def export_rows() -> List[tuple]:
+    """Every row in table order, for catalog archives."""
+    with _lock:
+        return _get_conn().execute("SELECT * FROM titles").fetchall()
+
+def import_rows(rows: Iterable[tuple]) -> int:
+    """Adds rows from export_rows(); titles we already have are kept. Returns the number of new rows."""
+    rows = list(rows)
+    with _lock:
+        conn = _get_conn()
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO titles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        return conn.total_changes - before
+
+def get_stats() -> dict:
+    with _lock:
+        rows = _get_conn().execute("SELECT locale, source, COUNT(*) FROM titles GROUP BY locale, source").fetchall()
+    locales, sources = {}, {}
+    for locale, source, count in rows:
+        locales[locale] = locales.get(locale, 0) + count
+        sources[source or 'unknown'] = sources.get(source or 'unknown', 0) + count
+    return {"titles": sum(locales.values()), "locales": locales, "sources": sources}
+
+def main(argv: Iterable[str] = None):
+    parser = argparse.ArgumentParser(description="Local title database for offline store metadata")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import a JSON or CSV title dump")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--locale", default="en-US", help="Locale for rows that don't name one (default: en-US)")
+    commands.add_parser("stats", help="Show the number of titles per locale and source")
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        import_file(args.path, args.locale)
+    print(json.dumps(get_stats(), indent=4))
+
+if __name__ == "__main__":
+    main()
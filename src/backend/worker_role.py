@@ -0,0 +1,146 @@
+# backend/worker_role.py
+#
+# With several worker processes (see runner.py) only one of them, the primary, scans
+# the library, rebuilds store.db and runs the background services. The others load
+# the published catalog from the on-disk index and follow its version file.
+# The primary is whoever holds an exclusive lock on LOCK_PATH; the OS releases it
+# when that process exits, so another worker can take over.
+#
+# Web UI actions that scan or update (scan, full rescan, binary update...) may land
+# on any worker. Secondaries hand them to the primary through small request files in
+# ACTIONS_DIR and wait for its result file. Things only the primary keeps track of
+# (store.db fetches for the console inventory) are posted the same way, without a reply.
+#
+# What every worker knows about itself (its running downloads) is written to a state
+# file per process in STATE_DIR, so any worker can answer for all of them.
+
+import os
+import json
+import time
+import asyncio
+from typing import List, Optional, Tuple
+
+LOCK_PATH = os.path.join(os.path.dirname(__file__), '.primary.lock')
+
+ACTIONS_DIR = os.path.join(os.path.dirname(__file__), '.actions')
+
+# How often the primary looks for forwarded actions, and secondaries for their result
+ACTION_POLL_SECONDS = 0.5
+
+STATE_DIR = os.path.join(os.path.dirname(__file__), '.workers')
+# How often workers write their state file; a file older than STATE_MAX_AGE is from an exited worker
+STATE_SECONDS = 1
+STATE_MAX_AGE = 10
+
+# Set by runner.py for every worker it starts
+WORKERS_ENV = 'PS4CDN_WORKERS'
+
+_lock_file = None
+
+def is_multi_worker() -> bool:
+    try:
+        return int(os.environ.get(WORKERS_ENV, '1')) > 1
+    except ValueError:
+        return False
+
+def try_become_primary() -> bool:
+    """Takes the primary lock without blocking. Returns True if this process holds it."""
+    global _lock_file
+    if _lock_file is not None: return True
+    f = open(LOCK_PATH, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close(); return False
+    _lock_file = f
+    return True
+
+def is_primary() -> bool:
+    return _lock_file is not None or not is_multi_worker()
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def submit_action(name: str, params: dict, reply: bool = True) -> str:
+    """Queues an action for the primary worker. Returns its id."""
+    os.makedirs(ACTIONS_DIR, exist_ok=True)
+    action_id = f"{time.time_ns()}-{os.getpid()}"
+    _write_json(os.path.join(ACTIONS_DIR, f"{action_id}.action"), {"name": name, "params": params, "reply": reply})
+    return action_id
+
+def post_action(name: str, params: dict):
+    """Queues an action for the primary worker that nobody waits for (no result file)."""
+    submit_action(name, params, reply=False)
+
+async def wait_for_result(action_id: str, timeout: Optional[float] = None) -> dict:
+    """Waits for the primary's {"status_code", "content"} result of a submitted action."""
+    path = os.path.join(ACTIONS_DIR, f"{action_id}.result")
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not os.path.exists(path):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"The primary worker did not answer within {timeout:.0f} seconds.")
+        await asyncio.sleep(ACTION_POLL_SECONDS)
+    with open(path, 'r') as f:
+        result = json.load(f)
+    os.remove(path)
+    return result
+
+def take_actions() -> List[Tuple[str, str, dict]]:
+    """Primary: removes and returns the queued actions as (id, name, params), oldest first. id is None for posted actions."""
+    try:
+        names = sorted(name for name in os.listdir(ACTIONS_DIR) if name.endswith('.action'))
+    except FileNotFoundError:
+        return []
+    actions = []
+    for name in names:
+        path = os.path.join(ACTIONS_DIR, name)
+        try:
+            with open(path, 'r') as f:
+                action = json.load(f)
+            os.remove(path)
+        except (OSError, ValueError) as e:
+            print(f"[!] Dropping unreadable action {name}: {e}")
+            try: os.remove(path)
+            except OSError: pass
+            continue
+        action_id = name[:-len('.action')] if action.get("reply", True) else None
+        actions.append((action_id, action.get("name"), action.get("params") or {}))
+    return actions
+
+def put_result(action_id: str, status_code: int, content):
+    _write_json(os.path.join(ACTIONS_DIR, f"{action_id}.result"), {"status_code": status_code, "content": content})
+
+def write_state(state: dict):
+    """Publishes this worker's state for the other workers."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    _write_json(os.path.join(STATE_DIR, f"{os.getpid()}.json"), {**state, "pid": os.getpid(), "updated": time.time()})
+
+def read_states() -> List[dict]:
+    """The state of every other running worker. Files left behind by exited workers are removed."""
+    try:
+        names = sorted(name for name in os.listdir(STATE_DIR) if name.endswith('.json') and name != f"{os.getpid()}.json")
+    except FileNotFoundError:
+        return []
+    states, now = [], time.time()
+    for name in names:
+        path = os.path.join(STATE_DIR, name)
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - state.get("updated", 0) > STATE_MAX_AGE:
+            try: os.remove(path)
+            except OSError: pass
+            continue
+        states.append(state)
+    return states
@@ -0,0 +1,67 @@
+# benchmarks/bench_package_records.py
+#
+# Memory benchmark: plain metadata dicts vs. compact PackageRecords.
+# Run from the 'src' folder:  python -m benchmarks.bench_package_records [count]
+
+import os
+import sys
+import random
+import tempfile
+import tracemalloc
+from backend import catalog_index
+from backend.package_record import PackageRecord
+
+LANG_CODES = ['JA', 'EN', 'FR', 'ES', 'DE', 'IT', 'NL', 'PT', 'RU', 'KO', 'CH', 'ZH', 'FI', 'SV', 'DA',
+              'NO', 'PL', 'BR', 'GB', 'TR', 'LA', 'AR', 'CA', 'CS', 'HU', 'EL', 'RO', 'TH', 'VI', 'IN']
+WORDS = "the a of open world adventure explore battle story friends online mode new edition".split()
+
+def make_metadata(i: int) -> dict:
+    """A package dict shaped like the output of pkg_manager.process_pkg_file."""
+    rng = random.Random(i)
+    title_id = f"CUSA{i:05d}"
+    title = f"Game {i} " + " ".join(rng.choice(WORDS) for _ in range(3))
+    apptype = rng.choice(['HB Game', 'App', 'DLC', 'Patch', 'Theme'])
+    metadata = {
+        'APP_TYPE': 1, 'APP_VER': rng.choice(['01.00', '01.05', '01.10']), 'ATTRIBUTE': 0,
+        'CATEGORY': 'gp' if apptype == 'Patch' else 'gd', 'CONTENT_ID': f"UP0000-{title_id}_00-{i:016d}",
+        'DOWNLOAD_DATA_SIZE': 0, 'FORMAT': 'obs', 'PARENTAL_LEVEL': rng.randint(1, 9),
+        'PUBTOOLINFO': 'c_date=20200101,sdk_ver=07008001,st_type=digital50', 'PUBTOOLVER': 117735424,
+        'REMOTE_PLAY_KEY_ASSIGN': 0, 'SERVICE_ID_ADDCONT_ADD_1': '', 'SYSTEM_VER': 0x07000000,
+        'TITLE': title, 'TITLE_ID': title_id, 'VERSION': '01.00',
+        'icon_url': f"/static/icons/{title_id}.png", 'file_path': f"/mnt/nas/games/{title_id}.pkg",
+        'file_size': rng.randint(10**8, 5 * 10**10), 'file_mtime': 1700000000000000000 + i,
+        'SIZE': f"{rng.randint(1, 50)}.{rng.randint(0, 9)} GB", 'apptype': apptype, 'library_root': '/mnt/nas',
+        'description': " ".join(rng.choice(WORDS) for _ in range(300)),
+        'rating': f"{rng.randint(1, 5)}.{rng.randint(0, 9)}", 'publisher': rng.choice(['Sony', 'EA', 'Ubisoft', 'Capcom']),
+        'release_date': '2020-01-01', 'mirrors': [],
+    }
+    # pkg_parser-style localized title duplicates
+    for code in LANG_CODES: metadata[f'TITLE_{code}'] = str(title)
+    return metadata
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return result, size
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_index.CATALOG_PATH = os.path.join(tmp, 'catalog.db')
+        print(f"Building {count} package dicts...")
+        dicts, dict_bytes = measure(lambda: [make_metadata(i) for i in range(count)])
+        catalog_index.save_packages(dicts)
+        del dicts
+        print(f"Building {count} package records...")
+        records, record_bytes = measure(lambda: [PackageRecord.from_metadata(make_metadata(i)) for i in range(count)])
+        print(f"\n  plain dicts:     {dict_bytes / 1024 / 1024:8.1f} MiB ({dict_bytes / count:7.0f} bytes/package)")
+        print(f"  PackageRecords:  {record_bytes / 1024 / 1024:8.1f} MiB ({record_bytes / count:7.0f} bytes/package)")
+        print(f"  saving:          {(1 - record_bytes / dict_bytes) * 100:8.1f} %")
+        print(f"\n  lazy description lookup: {len(records[count // 2].get('description', ''))} chars")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# benchmarks/bench_startup.py
+#
+# Startup benchmark: time from launching a cold server process until the first
+# byte of /store.db (and the /api.php hash) arrives. The backend is copied into a
+# temp folder together with a published catalog, so runtime files never touch
+# the real backend folder and no library scan is involved.
+# Run from the 'src' folder:  python -m benchmarks.bench_startup [count] [runs]
+
+import os
+import sys
+import time
+import socket
+import shutil
+import statistics
+import subprocess
+import tempfile
+import http.client
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIME_FILES = ('store.db', 'catalog.db*', 'walk_cache.json', 'views', 'bin', 'store_history', '.primary.lock', '__pycache__')
+
+SETUP_SCRIPT = """
+import sys
+from backend import catalog_index, db_manager, hb_formatter
+from benchmarks.bench_package_records import make_metadata
+count, base_uri = int(sys.argv[1]), sys.argv[2]
+packages = [make_metadata(i) for i in range(count)]
+db_manager.create_db_from_packages(hb_formatter.create_hb_store_item(pkg, base_uri, pid=i + 1) for i, pkg in enumerate(packages))
+catalog_index.save_published(packages, base_uri)
+"""
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _first_byte(port: int, path: str, deadline: float) -> float:
+    """Polls until the server answers; returns the time the first body byte arrived."""
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read(1)
+            received = time.perf_counter()
+            conn.close()
+            if response.status != 200: raise RuntimeError(f"{path} returned {response.status}")
+            return received
+        except (ConnectionError, OSError):
+            time.sleep(0.005)
+    raise TimeoutError(f"Server did not answer {path} in time.")
+
+def run_once(work_dir: str, env: dict) -> dict:
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        store_db = _first_byte(port, '/store.db', started + 60) - started
+        api_php = _first_byte(port, '/api.php?db_check_hash=true', started + 60) - started
+    finally:
+        proc.terminate(); proc.wait()
+    return {'store_db': store_db, 'api_php': api_php}
+
+def import_time(work_dir: str, env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import backend.main; print(time.perf_counter() - t)"
+    return float(subprocess.check_output([sys.executable, '-c', code], cwd=work_dir, env=env).decode().split()[-1])
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(os.path.join(SRC_DIR, 'backend'), os.path.join(tmp, 'backend'), ignore=shutil.ignore_patterns(*RUNTIME_FILES))
+        os.symlink(os.path.join(SRC_DIR, 'frontend'), os.path.join(tmp, 'frontend'))
+        env = dict(os.environ, PYTHONPATH=SRC_DIR)
+        subprocess.check_call([sys.executable, '-c', SETUP_SCRIPT, str(count), 'http://127.0.0.1:8000'], cwd=tmp, env=env, stdout=subprocess.DEVNULL)
+        subprocess.check_call([sys.executable, '-m', 'compileall', '-q', 'backend'], cwd=tmp)
+
+        imports = [import_time(tmp, env) for _ in range(runs)]
+        results = [run_once(tmp, env) for _ in range(runs)]
+        ms = lambda values: f"{statistics.median(values) * 1000:>8.1f} ms (min {min(values) * 1000:.1f})"
+        print(f"\nCold start with a published catalog of {count} packages, median of {runs} runs\n")
+        print(f"{'import backend.main':32} {ms(imports)}")
+        print(f"{'spawn -> first byte of /store.db':32} {ms([r['store_db'] for r in results])}")
+        print(f"{'spawn -> /api.php hash':32} {ms([r['api_php'] for r in results])}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# benchmarks/bench_store_delta.py
+#
+# Size benchmark: full store.db download vs. delta for typical catalog changes.
+# Every change is compared against the same original catalog. 'saving' is relative
+# to the gzip-compressed full download. Rows are matched by pid (list position), so
+# inserts and removals in the middle of the list show how far the saving drops.
+# Run from the 'src' folder:  python -m benchmarks.bench_store_delta [count]
+
+import os
+import sys
+import gzip
+import hashlib
+import tempfile
+from backend import db_manager, hb_formatter, store_history
+from benchmarks.bench_package_records import make_metadata
+
+BASE_URI = "http://192.168.1.10:8000"
+
+def publish(packages, db_path, base_uri=BASE_URI) -> str:
+    items = (hb_formatter.create_hb_store_item(pkg, base_uri, pid=i + 1) for i, pkg in enumerate(packages))
+    db_manager.create_db_from_packages(items, db_path=db_path)
+    with open(db_path, 'rb') as f:
+        md5 = hashlib.md5(f.read()).hexdigest()
+    store_history.record(db_path, md5)
+    return md5
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        store_history.HISTORY_DIR = os.path.join(tmp, 'history')
+        store_history.INDEX_PATH = os.path.join(store_history.HISTORY_DIR, 'index.json')
+        db_path = os.path.join(tmp, 'store.db')
+        packages = [make_metadata(i) for i in range(count)]
+        base = publish(packages, db_path)
+
+        print(f"\nCatalog of {count} packages\n")
+        print(f"{'change':36} {'full':>10} {'full gz':>10} {'delta gz':>10} {'saving':>8}")
+        def scenario(name, new_packages, base_uri=BASE_URI):
+            md5 = publish(new_packages, db_path, base_uri)
+            full_size = os.path.getsize(db_path)
+            with open(db_path, 'rb') as f:
+                full_gz = len(gzip.compress(f.read(), mtime=0))
+            delta = len(store_history.get_delta_gzip(base))
+            print(f"{name:36} {full_size:>10} {full_gz:>10} {delta:>10} {(1 - delta / full_gz) * 100:>7.1f}%")
+
+        scenario("1 package added (end of list)", packages + [make_metadata(count)])
+        # A new PKG normally sorts in between, which renumbers every later package
+        middle = count // 2
+        scenario("1 package added (middle of list)", packages[:middle] + [make_metadata(count)] + packages[middle:])
+        updated = [dict(pkg) for pkg in packages]
+        for pkg in updated[:10]: pkg['APP_VER'] = '02.00'; pkg['apptype'] = 'Patch'; pkg['file_mtime'] += 1
+        scenario("10 packages updated", updated)
+        scenario("5 packages removed (end of list)", packages[:-5])
+        scenario("1 package removed (start of list)", packages[1:])
+        scenario("server address changed", packages, "http://ps4cdn.lan:8000")
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,8 @@ cd /d "%~dp0"
 REM Activate the virtual environment
 call venv\Scripts\activate.bat
 
-REM Run uvicorn server
-uvicorn backend.main:app --reload --host 0.0.0.0
+REM Run the production server (no auto-reload). Add e.g. --workers 4 for more processes.
+python -m backend.runner --host 0.0.0.0
 
 REM Optional: Pause to see output after it ends
 pause
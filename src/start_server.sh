@@ -4,5 +4,5 @@ cd "$(dirname "$0")" || exit 1
 # Activate the virtual environment
 source venv/bin/activate
 
-# Run uvicorn server
-uvicorn backend.main:app --reload --host 0.0.0.0
+# Run the production server (no auto-reload). Add e.g. --workers 4 for more processes.
+python -m backend.runner --host 0.0.0.0